@@ -6,18 +6,40 @@
 #
 # For license information, see LICENSE
 
-from collections import namedtuple, defaultdict
-import logging, os, re, sys
-from textwrap import wrap
-from igraph import Graph, plot
+import time
+IMPORT_START = time.perf_counter()
 
-# fix to ensure that package is loaded properly on system path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from bisect import bisect_right
+from collections import deque, namedtuple, defaultdict
+from contextlib import redirect_stdout
+import gc, hashlib, io, json, logging, os, re, sys, tempfile
+from textwrap import wrap
 
-from tracecalls import TraceCalls
-from tokenizer import Tokenizer
-from parser import Parser, Node
-from error import ReaderError
+# igraph (and cairo) are only imported when a graph is drawn, see
+# ArgumentSet.graph and ArgumentSet.draw
+
+try:
+    # imported as part of the carneades package
+    from .tracecalls import TraceCalls
+    from .tokenizer import Tokenizer, read_lines
+    from .parser import (DictParser, IncrementalParser, Parser, SectionParser,
+                         Node, read_json)
+    from .error import DialogueError, ReaderError
+    from .events import MemorySink, NDJSONSink, TurnEvent, render_summary
+    from .render import (DOT_FORMATS, LayoutCache, RenderCache, Renderer,
+                         render_dot_files)
+except ImportError:
+    # run as a script from its directory
+    from tracecalls import TraceCalls
+    from tokenizer import Tokenizer, read_lines
+    from parser import (DictParser, IncrementalParser, Parser, SectionParser,
+                        Node, read_json)
+    from error import DialogueError, ReaderError
+    from events import MemorySink, NDJSONSink, TurnEvent, render_summary
+    from render import (DOT_FORMATS, LayoutCache, RenderCache, Renderer,
+                        render_dot_files)
+
+IMPORT_TIME = time.perf_counter() - IMPORT_START  # seconds
 
 # ========================================================================
 #           READER
@@ -32,29 +54,16 @@ class Reader(object):
     >>> reader = Reader(); # use default buffer_size
     >>> reader.load('../../samples/caes_org.yml', dialogue=False)
     <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
     ------ "accused committed murder" IS NOT acceptable ------
 
+    In headless mode, the results are returned and nothing is drawn:
+    >>> results = Reader().load('../../samples/caes_org.yml', dialogue=False,
+    ...                         headless=True)
+    >>> results
+    [IssueResult(issue=accused committed murder, acceptable=False)]
+
     >>> r = Reader()
     >>> d_arg = r.load('../../samplesTest/convergentarg.yml', dialogue=True)
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
-    <BLANKLINE>
     dialogue mode on
     <BLANKLINE>
     ------ "issue" IS NOT acceptable ------
@@ -83,19 +92,44 @@ class Reader(object):
     [premise2], ~[] => support 2
     """
 
-    def __init__(self, buffer_size=4096, indent_size=2):
+    def __init__(self,
+                 buffer_size=4096,
+                 indent_size=2,
+                 renderer=None,
+                 use_mmap=False,
+                 model_cache=None,
+                 incremental=False,
+                 parse_workers=0):
         """
         Initialise the Reader to read your source file with the user's settings
         ----
         PARAMETER:
         :param buffer_size: defaults to 4096
         :param indent_size: defaults to 2
+        :param renderer: the :class:`Renderer` drawing the graphs in the
+        background; defaults to a single worker thread
+        :param use_mmap: map the source file in memory instead of reading it
+        through a buffer, e.g. for very large files
+        :param model_cache: the :class:`ModelCache` of the models already
+        built, which are reused instead of reading the source file again
+        :param incremental: keep the lines and structure of the file, so
+        that building the file again after it is edited only parses the
+        sections that changed, and only adds the arguments that changed to
+        the argset (see :meth:`compile`)
+        :param parse_workers: if more than 0, the sections of the file are
+        tokenized and parsed in this number of worker processes, e.g. for
+        very large files (see :class:`SectionParser`)
         """
         # ---------------------------------------------------------------
         #   User defined parameters for the source file and parsing
         # ---------------------------------------------------------------
         self.buffer_size = buffer_size
         self.indent_size = indent_size
+        self.use_mmap = use_mmap
+        self.model_cache = model_cache
+        self.incremental = incremental
+        self.parse_workers = parse_workers
+        self.parser = None  # the IncrementalParser of the last build
         # ---------------------------------------------------------------
         #   Translate it into data structure for CAES
         # ---------------------------------------------------------------
@@ -109,8 +143,19 @@ class Reader(object):
         self.caes_gamma = float()
         self.caes_issue = set()
         self.argset = ArgumentSet()
-
-    def load(self, path_to_file, dialogue):
+        self.argument_sources = []  # see argument_source
+        if renderer is None:
+            renderer = Renderer()
+        self.renderer = renderer
+
+    def load(self,
+             path_to_file,
+             dialogue,
+             event_log=None,
+             checkpoint=None,
+             resume=False,
+             headless=False,
+             render_turns=False):
         """
         load the file of interest, tokenize and parse it. Using the information
         given by the user in the file(s), call CAES to evaluate the arguments
@@ -123,45 +168,316 @@ class Reader(object):
         proponent and opponent at each class:stage. At each stage, the best
         argument is put forth so as to attack the claim by the based on the
         party with the burden of proof.
+        :param event_log : In dialogue mode, the path of the file the turn
+        events are streamed to as NDJSON. If None, they are streamed to
+        `<issue number>_turns.ndjson` in the dot folder, or kept in memory in
+        headless mode. The events are the changes of the dialogue state from
+        turn to turn, from which the graph at any turn can be rendered on
+        demand with :class:`replay.DialogueReplay`.
+        :param checkpoint : In dialogue mode, the path of the file the
+        dialogue state is periodically checkpointed to.
+        :param resume : If True and the checkpoint file exists, resume the
+        dialogue from it.
+        :param headless : If True, only build and evaluate the arguments:
+        no directory is created or cleaned, nothing is drawn, and the results
+        are returned instead (see :meth:`evaluate`). The graphs can still be
+        rendered afterwards with :meth:`render`.
+        :param render_turns : In dialogue mode, also render the full graph
+        of the dialogue state each time it is logged, besides the final graph.
+
+        The graphs are rendered in the background by :attr:`renderer`, and
+        are all done when load returns.
         """
+        try:
+            return self._load(path_to_file, dialogue, event_log, checkpoint,
+                              resume, headless, render_turns)
+        finally:
+            self.renderer.flush()
+
+    def _load(self, path_to_file, dialogue, event_log, checkpoint, resume,
+              headless, render_turns):
+        self.build(path_to_file)
+
+        if headless:
+            if not dialogue:
+                return self.evaluate()
+            dot_dir = g_dir = None
+        else:
+            dot_dir, g_dir = self.prepare_output_dirs(
+                path_to_file, keep_turns=resume)
+
+        if not dialogue:  # dialogue == False
+            # define the filename for write_to_graphviz
+            dot_filename = dot_dir + 'full.dot'
+            g_filename = g_dir + 'full.pdf'
+            logging.info('\tInitialising CAES')
+            self.run(g_filename, dot_filename)
+            return
+
+        elif dialogue:
+            logging.debug('Dialogue Mode: On')
+            print('dialogue mode on')
+
+            # Go through each issue and generate a dialogue each
+            for i, issue in enumerate(sorted(self.caes_issue)):
+                # define the filenames, the number indicates the issue number
+                # starting from 1
+                dot_filename = g_filename = None
+                if not headless:
+                    dot_filename = dot_dir + '{}_'.format(i + 1)
+                    g_filename = g_dir + '{}_'.format(i + 1)
+                # # self.top_issue = issue
+                # dialogue_state_argset, summary, turn_num = \
+                #     self.dialogue(issue, g_filename, dot_filename)
+                logging.info(
+                    '********************************************************************************\nISSUE {}: "{}"\n********************************************************************************'.
+                    format(i, issue))
+
+                state = None
+                if resume and checkpoint is not None and \
+                        os.path.isfile(checkpoint):
+                    state = Dialogue.read_checkpoint(checkpoint)
+
+                turns = event_log
+                if turns is None and not headless:
+                    turns = dot_filename + 'turns.ndjson'
+
+                if turns is None:
+                    sink = MemorySink()
+                elif state is not None:
+                    # keep the events emitted before the checkpoint
+                    sink = NDJSONSink(
+                        turns, self.buffer_size, resume_at=state['seq'])
+                else:
+                    sink = NDJSONSink(turns, self.buffer_size)
+
+                # Call dialogue class to start the conversation
+                d = Dialogue(issue, self.argset, self.caes_assumption,
+                             self.caes_weight, self.caes_proofstandard,
+                             dot_filename, g_filename, self.run, sink,
+                             checkpoint, renderer=self.renderer,
+                             render_turns=render_turns)
+                if state is not None:
+                    d.resume(state)
+                try:
+                    d_argset = d.initialise_dialogue()
+                finally:
+                    sink.close()
+                return d_argset
+
+    def build(self, path_to_file):
+        """
+        Tokenize and parse the file, and build the arguments for CAES
+
+        If the reader has a :attr:`model_cache` and has not built anything
+        yet, the model built from a file with the same content (and indent
+        size) is reused, and the file is only read to compute its key.
+        Otherwise the model is built from the content that was hashed, so
+        that a file saved in the meantime is not cached under the old key.
+        """
+        key = data = None
+        if self.model_cache is not None and not self.caes_propliteral:
+            with open(path_to_file, 'rb') as f:
+                data = f.read()
+            key = self.model_cache.key(path_to_file, self.indent_size,
+                                       data=data)
+            model = self.model_cache.read(key)
+            if model is not None:
+                logging.info('\tLoaded the model from the cache')
+                self.restore_model(model)
+                return
+        # the nodes and arguments built are all kept, so the full collections
+        # of the garbage collector would only scan them again and again
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.compile(path_to_file, data)
+        finally:
+            if enabled:
+                gc.enable()
+        if key is not None:
+            self.model_cache.write(key, self.model_state())
+
+    def compile(self, path_to_file, data=None):
+        """
+        Tokenize and parse the file, and build the arguments for CAES,
+        without the :attr:`model_cache`
+
+        :param data: the content of the file, if it is already read; the
+        file is then not read again
+
+        If the reader is :attr:`incremental`, only the sections of the file
+        that changed since the previous build are parsed and built again
+        (see :class:`IncrementalParser` and :meth:`generate`). With
+        :attr:`parse_workers`, the sections are parsed in worker processes.
+
+        A `.json` or `.ndjson` file is read with :func:`read_json` instead,
+        see :meth:`build_case`.
+        """
+        if path_to_file.endswith(JSON_EXTENSIONS):
+            logging.info('\tReading JSON...')
+            self.build_case(read_json(path_to_file, data))
+            return
 
         # ---------------------------------------------------------------
         #   Scanning and lexical analsys
         # ---------------------------------------------------------------
         logging.info('\tTokenizing file...')
-        # read the file and store it as a list of lines!
-        stream = open(
-            path_to_file, 'r', buffering=self.buffer_size).readlines()
-        # call tokenizer will call tokenize() when initialised
-        t = Tokenizer(stream, self.indent_size)
+        if data is None:
+            lines = read_lines(path_to_file, self.buffer_size, self.use_mmap)
+        else:
+            # decoded as the file is when read as text
+            lines = io.TextIOWrapper(io.BytesIO(data))
+        if self.incremental or self.parse_workers > 0:
+            # the lines are kept, to split them into sections, and to find
+            # the sections that change
+            source = lines
+            try:
+                lines = list(source)
+            finally:
+                source.close()
+            logging.info('\tParsing tokens...')
+            if not self.incremental:
+                self.generate(
+                    SectionParser(lines, self.indent_size,
+                                  self.parse_workers))
+                return
+            p = IncrementalParser(lines, self.indent_size, self.parser,
+                                  self.parse_workers)
+            logging.info('\tSections changed: {}'.format(sorted(p.changed)))
+            self.generate(p, p.changed)
+            self.parser = p
+            return
+
+        # the file is streamed: the lines are read as the tokens are
+        # consumed by the parser, in a single pass
+        t = Tokenizer(lines, self.indent_size, lazy=True)
 
         # ---------------------------------------------------------------
         #   Parsing:
         # ---------------------------------------------------------------
         logging.info('\tParsing tokens...')
-        p = Parser(t.tokens)
+        try:
+            p = Parser(t.iter_tokens())
+        finally:
+            lines.close()
+        self.generate(p)
+
+    def build_case(self, case):
+        """
+        Build the arguments for CAES from a :param: case given as a dict
+        instead of a source file, e.g. by another program: its keys are the
+        headers of a source file, and their content is given as dicts,
+        lists, words and numbers, as in the source file (see
+        :class:`DictParser`). The case is checked as a source file is.
+
+        >>> case = {
+        ...     'PROPOSITION': {'kill': 'accused killed the victim',
+        ...                     'witness': 'a witness saw the killing'},
+        ...     'ASSUMPTION': ['witness'],
+        ...     'ARGUMENT': {'arg1': {'premise': ['witness'], 'exception': [],
+        ...                           'conclusion': 'kill', 'weight': 0.8}},
+        ...     'PARAMETER': {'alpha': 0.4, 'beta': 0.3, 'gamma': 0.2},
+        ...     'PROOFSTANDARD': {'kill': 'beyond reasonable doubt'},
+        ...     'ISSUE': ['kill']}
+        >>> reader = Reader()
+        >>> reader.build_case(case)
+        >>> reader.caes_proofstandard
+        [(accused killed the victim, 'beyond_reasonable_doubt')]
+        >>> print(reader.caes_argument['arg1'])
+        [a witness saw the killing], ~[] => accused killed the victim
+        >>> reader.build_case(dict(case, PROOFSTANDARD={'kill': 'doubtless'}))
+        Traceback (most recent call last):
+        ...
+        ValueError: Invalid proof standard "doubtless" found
+        """
+        self.parser = None  # the next source file is parsed in full
+        self.generate(DictParser(case))
+
+    def generate(self, p, changed=None):
+        """
+        Generate the arguments required for CAES from the :class:`Parser`
+        :param: p
+
+        :param changed: the headers of the sections that changed since the
+        previous build, or None if all of them did. What was generated from
+        the other sections is kept, and so are the arguments that did not
+        change: the argset is only truncated before the first argument that
+        changed, and the arguments from there are added again.
+
+        A section is generated from its structure and the propositions only,
+        so that after an error, the sections that changed since the last
+        build that succeeded are all generated again by the next build.
+        """
+
+        def redo(*headers):
+            return changed is None or any(h in changed for h in headers)
+
+        if redo('PROPOSITION'):
+            logging.info('\tAdding propositions to CAES')
+            self.caes_propliteral = self.generate_propositions(p.proposition)
+
+        if redo('PROPOSITION', 'ASSUMPTION'):
+            logging.info('\tAdding assumptions to CAES')
+            self.caes_assumption = self.generate_assumptions(p.assumption)
+
+        if redo('PROPOSITION', 'ARGUMENT'):
+            logging.info('\tAdding arguments to CAES')
+            # unless the propositions changed, an argument is only built
+            # again if its node changed
+            reuse = dict()
+            if not redo('PROPOSITION'):
+                for source, argument in zip(self.argument_sources,
+                                            self.argset.arguments):
+                    reuse.setdefault(source, []).append(argument)
+            self.patch_arguments(*self.generate_arguments(p.argument, reuse))
+
+        if redo('PARAMETER'):
+            logging.info('\tAdding parameter to CAES')
+            self.caes_alpha, self.caes_beta, self.caes_gamma = \
+                self.generate_parameters(p.parameter)
+
+        if redo('PROPOSITION', 'PROOFSTANDARD'):
+            logging.info('\tAdding proofstandard to CAES')
+            self.caes_proofstandard = self.generate_proofstandard(
+                p.proofstandard)
+
+        if redo('PROPOSITION', 'ISSUE'):
+            logging.info('\tAdding issues to CAES')
+            self.caes_issue = self.generate_issues(p.issue)
 
-        # ---------------------------------------------------------------
-        #   Generating the arguments required for CAES
-        # ---------------------------------------------------------------
-        # Processing proposition:
-        logging.info('\tAdding propositions to CAES')
-        for proplit in p.proposition.children:  # iterate through the list of children
+        # # -----------------------------------------------------------------
+        logging.debug('\talpha:{}, beta:{}, gamme:{}'.format(
+            self.caes_alpha, self.caes_beta, self.caes_gamma))
+        logging.debug('\tpropliterals: {} '.format(self.caes_propliteral))
+        logging.debug('\targuments:{} '.format(
+            [arg.__str__() for k, arg in self.caes_argument.items()]))
+        logging.debug('\tweights : {}'.format(self.caes_weight))
+        logging.debug('\tassumptions: {} '.format(self.caes_assumption))
+        logging.debug('\tissues: {} '.format(self.caes_issue))
+        logging.debug('\tproofstandard: {}'.format(self.caes_proofstandard))
+
+    def generate_propositions(self, node):
+        """
+        :rtype: dict - the :class:`PropLiteral` of each proposition id
+        """
+        caes_propliteral = dict()
+        for proplit in node.children:  # iterate through the list of children
             assert type(proplit) is Node
             prop_id = proplit.data
             text = proplit.children[0].data
             if prop_id[0] == '-':
                 raise ReaderError(
                     '"-" found in {}. Name of propositions are assumed to be True, and no polarity sign is need!'.
-                    format(p))
+                    format(node))
             # here, added prop_id as a field in PropLierals!
             # polarity is set to True by defailt
-            self.caes_propliteral[prop_id] = PropLiteral(text)
-
-        # -----------------------------------------------------------------
-        logging.info('\tAdding assumptions to CAES')
+            caes_propliteral[prop_id] = PropLiteral(text)
+        return caes_propliteral
 
-        for prop in p.assumption.children:
+    def generate_assumptions(self, node):
+        caes_assumption = set()
+        for prop in node.children:
             # check that the assumptions are in the set of caes_propliteral
             if self.check_prop(self.caes_propliteral, prop):
                 if prop[0] == '-':  # switch the polarity of the outcome!
@@ -171,16 +487,28 @@ class Reader(object):
                 else:
                     prop = self.caes_propliteral[prop]
 
-            self.caes_assumption.add(prop)
+            caes_assumption.add(prop)
+        return caes_assumption
 
-        # -----------------------------------------------------------------
-        logging.info('\tAdding arguments to CAES')
+    def generate_arguments(self, node, reuse):
+        """
+        :param reuse: the arguments built from the same node before, by
+        :func:`argument_source`, which are not built again
+        :rtype: tuple - the source of each argument and the arguments
+        """
         # In CAES: an argument consists of the following fields:
         # premises, exceptions, conclusion, weight
-        for arg_id in p.argument.children:
+        sources, arguments = [], []
+        for arg_id in node.children:
             # iterating through the each node of argument
             assert type(arg_id) is Node  # typecheck
 
+            source = argument_source(arg_id)
+            if reuse.get(source):
+                sources.append(source)
+                arguments.append(reuse[source].pop(0))
+                continue
+
             premise = set(arg_id.find_child('premise').children)
             exception = set(arg_id.find_child('exception').children)
             try:
@@ -194,9 +522,6 @@ class Reader(object):
             if weight < 0 or weight > 1:
                 raise ValueError('weight for {} ({}) is not in range [0,1]'.
                                  format(arg_id, weight))
-            else:
-                # store the weight in the dictionary for CAES
-                self.caes_weight[arg_id] = weight
 
             # check that the literals are in the PROPOSITION.
             # the checker returns the PropLiteral, so there's no need to
@@ -208,50 +533,84 @@ class Reader(object):
 
             if ok_c and ok_e and ok_p:
                 # store the arguments
-                self.caes_argument[arg_id] = \
+                sources.append(source)
+                arguments.append(
                     Argument(conclusion = conclusion,
                              premises   = premise,
                              exceptions = exception,
                              weight     = weight,
-                             arg_id     = arg_id)
-
-                # add to argset, the state of the argument is treated as None
-                # when it is added
-                self.argset.add_argument(self.caes_argument[arg_id])
-
-        # -----------------------------------------------------------------
-        logging.info('\tAdding parameter to CAES')
+                             arg_id     = arg_id))
+        return sources, arguments
+
+    def patch_arguments(self, sources, arguments):
+        """
+        Make the :param: arguments those of the reader and of its argset,
+        keeping the arguments the argset starts with
+        """
+        if not isinstance(self.argset, ArgumentSet):
+            # the arguments of a graph file (see load_graph) are built again
+            self.argset = ArgumentSet()
+        old = self.argset.arguments
+        kept = 0
+        while kept < min(len(old), len(arguments)):
+            if old[kept] is not arguments[kept]:
+                if argument_key(old[kept]) != argument_key(arguments[kept]):
+                    break
+                arguments[kept] = old[kept]  # the same argument
+            kept += 1
+        if kept < len(old):
+            logging.info('\tRemoving {} arguments from the graph'.format(
+                len(old) - kept))
+            self.argset.truncate(kept)
+
+        # add to argset, the state of the argument is treated as None when it
+        # is added
+        for argument in arguments[kept:]:
+            self.argset.add_argument(argument)
+        self.argument_sources = sources
+        self.caes_argument = dict()
+        self.caes_weight = dict()
+        for argument in arguments:
+            # store the weight in the dictionary for CAES
+            self.caes_weight[argument.arg_id] = argument.weight
+            self.caes_argument[argument.arg_id] = argument
 
-        for param in p.parameter.children:
+    def generate_parameters(self, node):
+        """
+        :rtype: tuple - alpha, beta and gamma
+        """
+        caes_alpha = caes_beta = caes_gamma = float()
+        for param in node.children:
             if param.data == 'alpha':
-                self.caes_alpha = float(param.children[0].data)
+                caes_alpha = float(param.children[0].data)
                 # check that they are within range
-                if self.caes_alpha > 1 or self.caes_alpha < 0:
+                if caes_alpha > 1 or caes_alpha < 0:
                     raise ValueError(
                         'alpha must be within the range of 0 and 1 inclusive. {} given'.
-                        format(self.caes_alpha))
+                        format(caes_alpha))
 
             elif param.data == 'beta':
-                self.caes_beta = float(param.children[0].data)
-                if self.caes_beta > 1 or self.caes_beta < 0:
+                caes_beta = float(param.children[0].data)
+                if caes_beta > 1 or caes_beta < 0:
                     raise ValueError(
                         'beta must be within the range of 0 and 1 inclusive. {} given'.
-                        format(self.caes_beta))
+                        format(caes_beta))
 
             elif param.data == 'gamma':
-                self.caes_gamma = float(param.children[0].data)
-                if self.caes_gamma > 1 or self.caes_gamma < 0:
+                caes_gamma = float(param.children[0].data)
+                if caes_gamma > 1 or caes_gamma < 0:
                     raise ValueError(
                         'gamma must be within the range of 0 and 1 inclusive. {} given'.
-                        format(self.caes_gamma))
+                        format(caes_gamma))
+        return caes_alpha, caes_beta, caes_gamma
 
-        # -----------------------------------------------------------------
-        logging.info('\tAdding proofstandard to CAES')
-        if len(p.proofstandard.children) == 0:
+    def generate_proofstandard(self, node):
+        caes_proofstandard = list()
+        if len(node.children) == 0:
             # use an empty list hence default PS for all the proposition
             pass
         else:
-            for ps in p.proofstandard.children:
+            for ps in node.children:
                 prop_id = ps.data
                 prop_ps = ps.children[0].data
                 # check validity of prop_id and prop_ps:
@@ -259,11 +618,12 @@ class Reader(object):
                 ok, prop_id = self.check_prop(self.caes_propliteral, prop_id)
                 # here, create and append the tuple that is used to
                 # defined the proofstandard
-                self.caes_proofstandard.append((prop_id, prop_ps))
+                caes_proofstandard.append((prop_id, prop_ps))
+        return caes_proofstandard
 
-        # -----------------------------------------------------------------
-        logging.info('\tAdding issues to CAES')
-        for issue in p.issue.children:
+    def generate_issues(self, node):
+        caes_issue = set()
+        for issue in node.children:
             # check that the prop_id are in the set of caes_propliteral
             if self.check_prop(self.caes_propliteral, issue):
                 if issue[0] == '-':  # switch the polarity of the propliteral
@@ -273,23 +633,132 @@ class Reader(object):
                 else:
                     prop = self.caes_propliteral[issue]
 
-            self.caes_issue.add(prop)
+            caes_issue.add(prop)
+        return caes_issue
+
+    def model_state(self):
+        """
+        The model built by :meth:`build`, as plain data (see
+        :class:`ModelCache`): the propositions are (string, polarity) pairs
+        and the arguments are kept in the order they were added.
+
+        >>> reader = Reader()
+        >>> reader.build('../../samples/caes_org.yml')
+        >>> copy = Reader()
+        >>> copy.restore_model(reader.model_state())
+        >>> copy.caes_issue == reader.caes_issue
+        True
+        >>> copy.argset.fingerprint() == reader.argset.fingerprint()
+        True
+        """
+
+        def prop(p):
+            return (p._string, p.polarity)
+
+        return {
+            'version': ModelCache.VERSION,
+            'propositions': [(prop_id, p._string)
+                             for prop_id, p in self.caes_propliteral.items()],
+            'assumptions': [prop(p) for p in self.caes_assumption],
+            'arguments': [(str(arg.arg_id), prop(arg.conclusion),
+                           [prop(p) for p in arg.premises],
+                           [prop(p) for p in arg.exceptions], arg.weight)
+                          for arg in self.argset.arguments],
+            'proofstandard': [(prop(p), ps)
+                              for p, ps in self.caes_proofstandard],
+            'parameters': (self.caes_alpha, self.caes_beta, self.caes_gamma),
+            'issues': [prop(p) for p in self.caes_issue]
+        }
 
-        # # -----------------------------------------------------------------
-        logging.debug('\talpha:{}, beta:{}, gamme:{}'.format(
-            self.caes_alpha, self.caes_beta, self.caes_gamma))
-        logging.debug('\tpropliterals: {} '.format(self.caes_propliteral))
-        logging.debug('\targuments:{} '.format(
-            [arg.__str__() for k, arg in self.caes_argument.items()]))
-        logging.debug('\tweights : {}'.format(self.caes_weight))
-        logging.debug('\tassumptions: {} '.format(self.caes_assumption))
-        logging.debug('\tissues: {} '.format(self.caes_issue))
-        logging.debug('\tproofstandard: {}'.format(self.caes_proofstandard))
+    def restore_model(self, model):
+        """
+        Set the model of the reader to a :meth:`model_state`, as if
+        :meth:`build` had read the file it was taken from
+        """
 
-        # -----------------------------------------------------------------
-        # Create file specific directory for graphing
-        dot_dir = '../../dot/{}/'.format(path_to_file.split('/')[-1][:-4])
-        g_dir = '../../graph/{}/'.format(path_to_file.split('/')[-1][:-4])
+        def prop(p):
+            return PropLiteral(p[0], polarity=p[1])
+
+        self.caes_propliteral = {
+            prop_id: PropLiteral(string)
+            for prop_id, string in model['propositions']
+        }
+        self.caes_assumption = set(map(prop, model['assumptions']))
+        self.caes_argument = dict()
+        self.caes_weight = dict()
+        arguments = []
+        for arg_id, conclusion, premises, exceptions, weight in \
+                model['arguments']:
+            arg_id = Node(arg_id)
+            argument = Argument(
+                conclusion=prop(conclusion),
+                premises=set(map(prop, premises)),
+                exceptions=set(map(prop, exceptions)),
+                weight=weight,
+                arg_id=arg_id)
+            arguments.append(argument)
+            self.caes_argument[arg_id] = argument
+            self.caes_weight[arg_id] = weight
+        self.argset = ArgumentSet.build(arguments)
+        self.caes_proofstandard = [(prop(p), ps)
+                                   for p, ps in model['proofstandard']]
+        self.caes_alpha, self.caes_beta, self.caes_gamma = \
+            model['parameters']
+        self.caes_issue = set(map(prop, model['issues']))
+
+    def write_graph(self, path):
+        """
+        Write the arguments built to the binary graph file at :param: path,
+        see :func:`graphfile.write_graph`
+        """
+        try:
+            from .graphfile import write_graph
+        except ImportError:
+            from graphfile import write_graph
+        write_graph(self.argset, path)
+
+    def load_graph(self, path):
+        """
+        Evaluate the arguments of the binary graph file at :param: path,
+        mapped in memory (see :class:`graphfile.MappedArgumentSet`), instead
+        of the arguments built; the rest of the model is kept. The next
+        build builds the arguments again.
+
+        >>> import tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'caes_org.args')
+        >>> reader = Reader()
+        >>> reader.build('../../samples/caes_org.yml')
+        >>> expected = reader.evaluate()
+        >>> reader.write_graph(path)
+        >>> reader.load_graph(path)
+        >>> type(reader.argset).__name__
+        'MappedArgumentSet'
+        >>> reader.evaluate() == expected
+        True
+        >>> reader.argset.close()
+        >>> os.remove(path)
+        """
+        try:
+            from .graphfile import MappedArgumentSet
+        except ImportError:
+            from graphfile import MappedArgumentSet
+        self.argset = MappedArgumentSet(path)
+        self.caes_weight = self.argset.weights
+        self.caes_argument = dict()  # the arguments are created on demand
+        self.argument_sources = []
+        self.parser = None
+
+    def prepare_output_dirs(self, path_to_file, keep_turns=False):
+        """
+        Create the file specific directories for graphing, or clean the files
+        left in them by a previous run
+
+        :param keep_turns : keep the turn events of the dialogues, e.g. to
+        resume a dialogue
+        :rtype: tuple - the dot and the graph directories
+        """
+        dot_dir = '../../dot/{}/'.format(case_name(path_to_file))
+        g_dir = '../../graph/{}/'.format(case_name(path_to_file))
 
         if not os.path.exists(dot_dir):
             os.makedirs(dot_dir)
@@ -298,51 +767,68 @@ class Reader(object):
             # Clearn the folders
             for the_file in os.listdir(dot_dir):
                 file_path = os.path.join(dot_dir, the_file)
+                if keep_turns and the_file.endswith('_turns.ndjson'):
+                    continue
                 if os.path.isfile(file_path) and the_file != 'full.dot':
                     os.unlink(file_path)
             for the_file in os.listdir(g_dir):
                 file_path = os.path.join(g_dir, the_file)
                 if os.path.isfile(file_path) and the_file != 'full.pdf':
                     os.unlink(file_path)
+        return dot_dir, g_dir
 
-        if not dialogue:  # dialogue == False
-            # define the filename for write_to_graphviz
-            dot_filename = dot_dir + 'full.dot'
-            g_filename = g_dir + 'full.pdf'
-            logging.info('\tInitialising CAES')
-            self.run(g_filename, dot_filename)
-            return
+    def render(self, path_to_file, argset=None):
+        """
+        Draw the argumentation graph and write it to graphviz in the
+        directories of :param: path_to_file, e.g. after a headless
+        :meth:`load`
 
-        elif dialogue:
-            logging.debug('Dialogue Mode: On')
-            print('dialogue mode on')
+        :param argset : the argset to render, by default all the arguments
+        parsed
+        """
+        if argset is None:
+            argset = self.argset
+        dot_dir = '../../dot/{}/'.format(case_name(path_to_file))
+        g_dir = '../../graph/{}/'.format(case_name(path_to_file))
+        for directory in (dot_dir, g_dir):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+        self.renderer.submit(argset, g_dir + 'full.pdf', dot_dir + 'full.dot')
+        self.renderer.flush()
 
-            # Go through each issue and generate a dialogue each
-            for i, issue in enumerate(self.caes_issue):
-                # define the filenames, the number indicates the issue number
-                # starting from 1
-                dot_filename = dot_dir + '{}_'.format(i + 1)
-                g_filename = g_dir + '{}_'.format(i + 1)
-                # # self.top_issue = issue
-                # dialogue_state_argset, summary, turn_num = \
-                #     self.dialogue(issue, g_filename, dot_filename)
-                logging.info(
-                    '********************************************************************************\nISSUE {}: "{}"\n********************************************************************************'.
-                    format(i, issue))
+    def evaluate(self, argset=None, proofstandard=None, issues=None):
+        """
+        Evaluate the issues in CAES without printing or drawing anything
 
-                # Call dialogue class to start the conversation
-                d = Dialogue(issue, self.argset, self.caes_assumption,
-                             self.caes_weight, self.caes_proofstandard,
-                             dot_filename, g_filename, self.run)
-                d_argset = d.initialise_dialogue()
-                return d_argset
+        :param issues : the issues to evaluate, by default all the issues
+        parsed
+        :rtype: list - an :class:`IssueResult` per issue, sorted by issue
+        """
+        if argset is None:
+            argset = self.argset
+        if proofstandard is None:
+            proofstandard = ProofStandard(self.caes_proofstandard)
+        if issues is None:
+            issues = self.caes_issue
+        caes = CAES(
+            argset=argset,
+            audience=Audience(self.caes_assumption, self.caes_weight),
+            proofstandard=proofstandard,
+            alpha=self.caes_alpha,
+            beta=self.caes_beta,
+            gamma=self.caes_gamma)
+        return [
+            IssueResult(issue, caes.acceptable(issue))
+            for issue in sorted(issues)
+        ]
 
     def run(self,
             g_filename=None,
             dot_filename=None,
             proofstandard=None,
             argset=None,
-            issues=None):
+            issues=None,
+            quiet=False):
         """
         Check if the given argumentation graph is acceptable in the parameters
         parsed - i.e. evaluate in CAES using the proofstandards and the Audience
@@ -352,15 +838,21 @@ class Reader(object):
         :param argset : for evaluating the issue based on the current
         argumentation graph argset instead of all the arguments parsed.
         :param proofstandard: The proofstandard applicable to the arguments in the argset
+        :param quiet: only evaluate the issue: nothing is drawn, printed or
+        logged, e.g. while a resumed dialogue fast-forwards
         """
 
         if argset is None:
             argset = self.argset
         if proofstandard is None:
             proofstandard = ProofStandard(self.caes_proofstandard)
-        if g_filename is not None and dot_filename is not None:
-            argset.draw(g_filename)
-            argset.write_to_graphviz(dot_filename)
+        if g_filename is not None and dot_filename is not None and not quiet:
+            if hasattr(argset, 'snapshot'):
+                # the argset keeps changing while it is rendered
+                self.renderer.submit(argset.snapshot(), g_filename,
+                                     dot_filename)
+            else:
+                self.renderer.submit(argset, g_filename, dot_filename)
 
         # ------------------------------------------------------------
         #       Evaluate the issues using CAES
@@ -388,6 +880,8 @@ class Reader(object):
         elif isinstance(issues, PropLiteral):
             # evaluating a single statement usually based on the current
             # argumentation graph
+            if quiet:
+                return caes.acceptable(issues)
             logging.info('Evaluating issue: "{}"'.format(issues))
             acceptability = caes.acceptable(issues)
             logging.info('------ "{}" {} acceptable ------'.format(
@@ -463,6 +957,121 @@ class Reader(object):
             raise ValueError('Invalid proof standard "{}" found'.format(query))
 
 
+def argument_source(node):
+    """
+    The structure of the :class:`Node` of an argument, as a hashable value:
+    two arguments with the same source are built the same
+
+    >>> node = Node('arg1'); node.add_child(Node('premise'))
+    >>> node.find_child('premise').add_child(['p', 'q'])
+    >>> argument_source(node)
+    ('arg1', (('premise', ('p', 'q')),))
+    """
+    if type(node) is not Node:
+        return node
+    return (node.data, tuple(argument_source(child) for child in node.children))
+
+
+def argument_key(argument):
+    """
+    What an :class:`Argument` is made of, to tell whether two arguments are
+    the same
+    """
+    return (str(argument.arg_id), str(argument.conclusion),
+            sorted(map(str, argument.premises)),
+            sorted(map(str, argument.exceptions)), argument.weight)
+
+
+class ModelCache(object):
+    """
+    A directory of the models built by :meth:`Reader.build`, in a compact
+    binary file (a pickle of the plain data of :meth:`Reader.model_state`)
+    named after the hash of the content of the source file and the indent
+    size (see :meth:`key`).
+
+    The pickles only hold built-in types: a cached model that holds
+    anything else, or cannot be read, is ignored and built again. When the
+    cache grows over :param: max_bytes, the models least recently used are
+    removed, as in a :class:`RenderCache`.
+
+    >>> import shutil, tempfile
+    >>> tmp = tempfile.mkdtemp()
+    >>> cache = ModelCache(tmp)
+    >>> reader = Reader(model_cache=cache)
+    >>> reader.build('../../samples/caes_org.yml')  # built and stored
+    >>> key = cache.key('../../samples/caes_org.yml', indent_size=2)
+    >>> cache.read(key) == reader.model_state()
+    True
+    >>> cache.key('../../samples/caes_org.yml', indent_size=4) == key
+    False
+    >>> shutil.rmtree(tmp)
+    """
+    VERSION = 1  # of the model state, bumped when it changes
+
+    def __init__(self, cache_dir, max_bytes=64 * 1024 * 1024):
+        self.files = RenderCache(cache_dir, max_bytes)
+
+    def key(self, path_to_file, indent_size, buffer_size=4096, data=None):
+        """
+        The key of the model of the file at :param: path_to_file
+
+        :param data: the content of the file, if it is already read
+        """
+        h = hashlib.sha256('{}:{}:'.format(self.VERSION,
+                                           indent_size).encode('ascii'))
+        if data is not None:
+            h.update(data)
+            return h.hexdigest()
+        with open(path_to_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(buffer_size), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def read(self, key):
+        """
+        The model cached under :param: key, or None
+        """
+        import pickle
+
+        class Unpickler(pickle.Unpickler):
+            def find_class(self, module, name):
+                raise pickle.UnpicklingError(
+                    '{}.{} found in a cached model'.format(module, name))
+
+        path = os.path.join(self.files.cache_dir, key + '.model')
+        try:
+            with open(path, 'rb') as f:
+                model = Unpickler(f).load()
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning('Ignoring the cached model {}: {}'.format(path, e))
+            return None
+        if type(model) is not dict or model.get('version') != self.VERSION:
+            return None
+        return model
+
+    def write(self, key, model):
+        """
+        Cache the :param: model under :param: key
+        """
+        import pickle
+        os.makedirs(self.files.cache_dir, exist_ok=True)
+        path = os.path.join(self.files.cache_dir, key + '.model')
+        # a temporary of its own, as in RenderCache.store
+        fd, tmp = tempfile.mkstemp(dir=self.files.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            raise
+        self.files.evict()
+
+
 # ========================================================================
 #       EXTENSION FOR DIALOGUE
 # ========================================================================
@@ -472,10 +1081,38 @@ class Dialogue(object):
     """
     :class Dialogue simulates the conversation between the proponent and opponent in
     the courthouse
+
+    Every state logged by `dialogue_log` is emitted as a :class:`TurnEvent` to
+    the event :param: sink (a :class:`MemorySink` if not given), from which the
+    dialogue summary is rendered. The version of the dialogue argset at each
+    event is kept in `history`.
+
+    The dialogue argset is a :class:`ArgumentSetView` over the full argset, so
+    that putting an argument forth does not copy it into a graph of its own.
+
+    If a :param: checkpoint path is given, the dialogue state is written to it
+    every :param: checkpoint_every events. As the dialogue is a recursion
+    whose call stack cannot be saved, a dialogue resumed from a checkpoint
+    (see :meth:`resume`) fast-forwards through the events before the
+    checkpoint without logging, emitting or drawing them, checks that it
+    reached the checkpointed state, and carries on from there. The moves are
+    hence the same as in an uninterrupted dialogue.
     """
 
-    def __init__(self, issue, caes_argset, caes_assumption, caes_weight,
-                 caes_proofstandard, dot_filename, g_filename, run):
+    def __init__(self,
+                 issue,
+                 caes_argset,
+                 caes_assumption,
+                 caes_weight,
+                 caes_proofstandard,
+                 dot_filename,
+                 g_filename,
+                 run,
+                 sink=None,
+                 checkpoint=None,
+                 checkpoint_every=10,
+                 renderer=None,
+                 render_turns=True):
         self.top_issue = issue
         self.caes_weight = caes_weight
         self.argset = caes_argset
@@ -483,11 +1120,26 @@ class Dialogue(object):
         self.caes_assumption = caes_assumption
 
         # variables for the dialogue
-        self.dialogue_state_argset = ArgumentSet()
+        self.dialogue_state_argset = ArgumentSetView(self.argset)
+        self.history = []  # the version of the argset at each event
         self.burden_status = None
         self.turn_num = 0
         self.actors = ['PROPONENT', 'RESPONDENT']
-        self.summary = ""
+        self.sink = sink if sink is not None else MemorySink()
+        self.seq = 0  # number of events emitted
+        self.logged_args = 0  # number of arguments already in an event
+        self.logged_changes = 0  # number of state changes already seen
+        self.logged_states = dict()  # proposition states already in an event
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        if renderer is None:
+            renderer = Renderer(workers=0)
+        self.renderer = renderer
+        self.render_turns = render_turns
+        self.drawn = defaultdict(int)  # number of graphs drawn at each turn
+        self.layout_cache = LayoutCache()  # keep the graphs of turns alike
+        self.resume_state = None  # the checkpoint to fast-forward to
+        self.muted = False  # see mute
         self.dot_filename = dot_filename
         self.g_filename = g_filename
         self.run = run  # function for evaluation
@@ -497,14 +1149,107 @@ class Dialogue(object):
         # -----------------------------------------------------------------
         # RUN the dialogue
         # -----------------------------------------------------------------
-        self.dialogue(self.top_issue)
-
-        # Print the dialogue summary
+        try:
+            self.dialogue(self.top_issue)
+        finally:
+            self.mute(False)
+        if self.resume_state is not None:
+            raise DialogueError(
+                'The dialogue ended before reaching the checkpoint at event {}'.
+                format(self.resume_state['seq']))
+        if self.checkpoint is not None and os.path.isfile(self.checkpoint):
+            # the dialogue is complete, there is nothing to resume
+            os.unlink(self.checkpoint)
+
+        # Print the dialogue summary, rendered from the events
         logging.info(
             '\n\n\n********************************************************************************DIALOGUE SUMMARY:\n********************************************************************************\n{}********************************************************************************'.
             format(self.summary))
         return self.dialogue_state_argset
 
+    @property
+    def summary(self):
+        """
+        The human-readable dialogue traces, rendered from the events
+        """
+        return render_summary(self.sink.events())
+
+    # ------------------------------------------------------------
+    #       Checkpoints
+    # ------------------------------------------------------------
+
+    def checkpoint_state(self):
+        """
+        The state of the dialogue after the last event, as a dict that can be
+        written as JSON
+        """
+        argset = self.dialogue_state_argset
+        states = dict()
+        for prop in argset.props:
+            state = argset.state(prop)
+            if state is not None:
+                states[str(prop)] = state
+        return {
+            'top_issue': str(self.top_issue),
+            'seq': self.seq,
+            'turn_num': self.turn_num,
+            'burden_status': self.burden_status,
+            'arguments': [[str(arg.arg_id), claimer]
+                          for arg, claimer in zip(argset.arguments,
+                                                  argset.claimers)],
+            'states': states
+        }
+
+    def write_checkpoint(self):
+        """
+        Write the checkpoint atomically, so that an interrupt leaves the
+        previous checkpoint intact. The events emitted before are synced to
+        disk first, so that a checkpoint never gets ahead of the event log.
+        """
+        self.sink.sync()
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.checkpoint_state(), f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint)
+        logging.debug('checkpoint written at event {}'.format(self.seq))
+
+    @staticmethod
+    def read_checkpoint(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def resume(self, state):
+        """
+        Resume the dialogue from a checkpoint :param: state (see
+        :meth:`read_checkpoint`) when :meth:`initialise_dialogue` is called.
+        """
+        if state['top_issue'] != str(self.top_issue):
+            raise DialogueError(
+                'The checkpoint is for issue "{}", not "{}"'.format(
+                    state['top_issue'], self.top_issue))
+        self.resume_state = state
+        logging.info('Resuming the dialogue from event {}'.format(state[
+            'seq']))
+        self.mute(True)
+
+    def mute(self, muted):
+        """
+        Stop (or start again) the logging and the tracing of the dialogue,
+        while it fast-forwards to the checkpoint it resumes from: the
+        arguments are still evaluated, to make the same moves, but what was
+        output before the checkpoint is not output again
+        """
+        if muted == self.muted:
+            return
+        self.muted = TraceCalls.muted = muted
+        if muted:
+            self.logging_disabled = logging.root.manager.disable
+            logging.disable(logging.INFO)
+        else:
+            logging.disable(self.logging_disabled)
+
     @TraceCalls()
     def dialogue(self, issue):
         """
@@ -541,7 +1286,7 @@ class Dialogue(object):
                 arg for arg in args_pro_issue
                 if arg not in args_pro_issue_dialogue
             ]
-        except KeyError:
+        except (KeyError, ValueError):
             # If there are no arguments leading to the issue in the current
             # argset, continue
             pass
@@ -667,8 +1412,7 @@ class Dialogue(object):
         if not result:
             # Burden of proof not met for sub issues:
             if issue == self.top_issue:
-                g_file = self.g_filename + 'final.pdf'
-                dot_file = self.dot_filename + 'final.dot'
+                g_file, dot_file = self.final_filenames()
                 self.run(g_filename=g_file,
                          dot_filename=dot_file,
                          argset=self.dialogue_state_argset,
@@ -678,13 +1422,13 @@ class Dialogue(object):
 
         else:
             acceptability = self.run(argset=self.dialogue_state_argset,
-                                     issues=issue)
+                                     issues=issue,
+                                     quiet=self.resume_state is not None)
             if acceptability:
                 # proponent of issue still wins; we are happy and we shall end!
                 logging.info('proponent wins~')
                 if issue == self.top_issue:
-                    g_file = self.g_filename + 'final.pdf'
-                    dot_file = self.dot_filename + 'final.dot'
+                    g_file, dot_file = self.final_filenames()
                     self.run(g_filename=g_file,
                              dot_filename=dot_file,
                              argset=self.dialogue_state_argset,
@@ -698,14 +1442,22 @@ class Dialogue(object):
                     return self.dialogue(issue)
                 else:
                     if issue == self.top_issue:
-                        g_file = self.g_filename + 'final.pdf'
-                        dot_file = self.dot_filename + 'final.dot'
+                        g_file, dot_file = self.final_filenames()
                         self.run(g_filename=g_file,
                                  dot_filename=dot_file,
                                  argset=self.dialogue_state_argset,
                                  issues=issue)
                     return False
 
+    def final_filenames(self):
+        """
+        The filenames of the final graphs of the dialogue; None if the
+        dialogue is not drawn
+        """
+        if self.g_filename is None or self.dot_filename is None:
+            return None, None
+        return self.g_filename + 'final.pdf', self.dot_filename + 'final.dot'
+
     @TraceCalls()
     def burden_met(self, issue, current_argument):
         """
@@ -738,7 +1490,7 @@ class Dialogue(object):
             return self.burden_status
         else:
             # if the burden is not met, support the premises to the argument
-            for premise in current_argument.premises:
+            for premise in sorted(current_argument.premises):
                 # find arguments that support the premises
                 logging.info('Current Premise: "{}"'.format(premise))
                 for arg in self.argset.get_arguments(premise):
@@ -795,7 +1547,7 @@ class Dialogue(object):
 
             # ----------------------------------------------------------------_
             # first: try to establish the exception:
-            exceptions = arg.exceptions
+            exceptions = sorted(arg.exceptions)
 
             # get a list of arguments that support the exceptions
             # here, we use the full argset instead of the dialogue argset!
@@ -824,7 +1576,7 @@ class Dialogue(object):
             # ----------------------------------------------------------------_
             # add arguments for sub-issues to the list of arguments to be
             # considered - similar to Breadth First Search
-            premises = arg.premises
+            premises = sorted(arg.premises)
             for p in premises:
                 args_to_consider.extend(
                     self.dialogue_state_argset.get_arguments(p))
@@ -887,7 +1639,7 @@ class Dialogue(object):
             # ----------------------------------------------------------------_
             # add arguments for subissues to the list of arguments to be
             # considered - similar to Breadth First Search
-            premises = arg.premises
+            premises = sorted(arg.premises)
             for p in premises:
                 args_to_consider.extend(
                     self.dialogue_state_argset.get_arguments(p))
@@ -929,7 +1681,7 @@ class Dialogue(object):
 
             # ----------------------------------------------------------------_
             # first: try to establish the exception:
-            exceptions = arg.exceptions
+            exceptions = sorted(arg.exceptions)
 
             # get a list of arguments that support the exceptions
             # here, we use the full argset instead of the dialogue argset!
@@ -960,7 +1712,7 @@ class Dialogue(object):
             # ----------------------------------------------------------------_
             # add arguments for subissues to the list of arguments to be
             # considered - similar to Breadth First Search
-            premises = arg.premises
+            premises = sorted(arg.premises)
             for p in premises:
                 args_to_consider.extend(
                     self.dialogue_state_argset.get_arguments(p))
@@ -1001,43 +1753,50 @@ class Dialogue(object):
 
     def dialogue_log(self, issue, draw=1):
         """
-        1) print and log the current dialogue status
+        1) print and log the current dialogue status, and emit it as a
+        :class:`TurnEvent` to the sink
             - Which party have the burden of proof
             - the arguments in the current state
             - satisfiability of the burden of proof by the actor
             - the acceptability of the top level issue at the curent level
         2) output the graph for viewing at this turn!
         """
+        actor = self.actors[self.turn_num % 2]
+        if self.resume_state is not None:
+            # fast-forward: this event was emitted before the checkpoint
+            self.added_arguments()
+            self.changed_states()
+            self.history.append(self.dialogue_state_argset.snapshot())
+            self.seq += 1
+            if self.seq == self.resume_state['seq']:
+                if self.checkpoint_state() != self.resume_state:
+                    raise DialogueError(
+                        'The dialogue does not reach the checkpointed state at event {}'.
+                        format(self.seq))
+                self.resume_state = None
+                self.mute(False)
+            return
+
         # --------------------------------------------------------------------
         #   CURRENT STAUS
         # --------------------------------------------------------------------
         logging.info('\n================== turn {} =================='.format(
             self.turn_num))
-        self.summary += '================== turn {} =================='.format(
-            self.turn_num) + '\n'
         # print Where the BOP lies in for this turn
-        logging.info('BURDEN OF PROOF @ {}'.format(self.actors[self.turn_num %
-                                                               2]))
-        self.summary += 'BURDEN OF PROOF @ {}'.format(self.actors[self.turn_num
-                                                                  % 2]) + '\n'
+        logging.info('BURDEN OF PROOF @ {}'.format(actor))
         # --------------------------------------------------------------------
         #   ARGUMENTS
         # --------------------------------------------------------------------
         logging.info('ARGUMENTS:')
-        self.summary += 'ARGUMENTS:'
         for arg in self.dialogue_state_argset.arguments:
             logging.info(arg.__str__())
-            self.summary += '\n' + arg.__str__()
 
         # --------------------------------------------------------------------
         #   BURDEN OF PROOF
         # --------------------------------------------------------------------
         logging.info(
             "-----------------------------------------\nBurden of proof met by {} : {}".
-            format(self.actors[self.turn_num % 2], self.burden_status))
-        self.summary += (
-            "\n-----------------------------------------\nBurden of proof met by {} : {}".
-            format(self.actors[self.turn_num % 2], self.burden_status))
+            format(actor, self.burden_status))
 
         # --------------------------------------------------------------------
         # TOP ISSUE:
@@ -1057,39 +1816,92 @@ class Dialogue(object):
         acceptability = self.run(argset=self.dialogue_state_argset,
                                  issues=issue,
                                  proofstandard=ProofStandard(ps))
-        self.summary += (
-            "\n-----------------------------------------\n\t\tISSUE \"{}\" acceptable? -> {}".
-            format(issue, acceptability))
 
+        acceptability_top = None
         if self.top_issue != issue:
             acceptability_top = self.run(argset=self.dialogue_state_argset,
                                          issues=self.top_issue,
                                          proofstandard=ProofStandard(ps))
-            self.summary += ("\nTOP ISSUE \"{}\" acceptable? -> {}".format(
-                self.top_issue, acceptability_top))
+
+        # --------------------------------------------------------------------
+        # EVENT
+        # --------------------------------------------------------------------
+        self.sink.emit(
+            TurnEvent(
+                seq=self.seq,
+                turn=self.turn_num,
+                actor=actor,
+                issue=str(issue),
+                burden_status=self.burden_status,
+                acceptable=acceptability,
+                top_issue=str(self.top_issue),
+                top_acceptable=acceptability_top,
+                added=self.added_arguments(),
+                states=self.changed_states()))
+        self.history.append(self.dialogue_state_argset.snapshot())
+        self.seq += 1
+        if self.checkpoint is not None and \
+                self.seq % self.checkpoint_every == 0:
+            self.write_checkpoint()
 
         # --------------------------------------------------------------------
         # GRAPHS
         # --------------------------------------------------------------------
-        if draw:
-
-            g_file = self.g_filename + str(self.turn_num) + '.pdf'
-            dot_file = self.dot_filename + str(self.turn_num) + '.dot'
-            num = 1
-            if os.path.isfile(g_file):
-                g_file = self.g_filename + str(self.turn_num) + '-' + str(
-                    num) + '.pdf'
-                while os.path.isfile(g_file):
-                    num += 1
-                    g_file = self.g_filename + str(self.turn_num) + '-' + str(
-                        num) + '.pdf'
-
-                dot_file = self.dot_filename + str(self.turn_num) + '-' + str(
-                    num) + '.dot'
-            self.dialogue_state_argset.draw(g_file)
-            self.dialogue_state_argset.write_to_graphviz(dot_file)
+        if draw and self.render_turns and self.g_filename is not None:
+
+            # the graphs may not be written yet, so count the graphs drawn
+            # at this turn instead of looking for the files
+            num = self.drawn[self.turn_num]
+            self.drawn[self.turn_num] += 1
+            name = str(self.turn_num)
+            if num:
+                name += '-' + str(num)
+            self.renderer.submit(
+                self.dialogue_state_argset.snapshot(),
+                self.g_filename + name + '.pdf',
+                self.dot_filename + name + '.dot',
+                layout_cache=self.layout_cache)
         logging.info('============================================\n')
-        self.summary += '\n============================================\n'
+
+    def added_arguments(self):
+        """
+        The arguments added to the dialogue state since the last event, in the
+        form used by :attr:`TurnEvent.added`
+        """
+        argset = self.dialogue_state_argset
+        added = []
+        for i in range(self.logged_args, len(argset.arguments)):
+            arg = argset.arguments[i]
+            added.append({
+                'arg_id': str(arg.arg_id),
+                'claimer': argset.claimers[i],
+                'conclusion': str(arg.conclusion),
+                'premises': sorted(str(p) for p in arg.premises),
+                'exceptions': sorted(str(e) for e in arg.exceptions),
+                'weight': arg.weight
+            })
+        self.logged_args = len(argset.arguments)
+        return added
+
+    def changed_states(self):
+        """
+        The propositions whose state changed since the last event, read from
+        the changes recorded by the dialogue argset since then
+        """
+        argset = self.dialogue_state_argset
+        latest = dict()
+        for prop, state in argset.changes[self.logged_changes:]:
+            latest[prop] = state
+        self.logged_changes = len(argset.changes)
+        changed = dict()
+        # in the order the propositions were put in play, as they are logged
+        for prop in sorted(latest, key=argset.prop_index.get):
+            state = latest[prop]
+            prop = str(prop)
+            if self.logged_states.get(prop) != state:
+                changed[prop] = state
+                self.logged_states[prop] = state
+        return changed
 
 
 # ========================================================================
@@ -1210,26 +2022,167 @@ class Argument(object):
 # ========================================================================
 
 
+def dot_label(label):
+    """
+    Format a vertex label for graphviz, wrapped at 40 characters
+
+    >>> dot_label('Witness1 said "attack"')
+    'Witness1 said \\\\"attack\\\\"'
+    """
+    lines = wrap(str(label), 40)
+    return '\\n'.join(
+        line.replace('\\', '\\\\').replace('"', '\\"') for line in lines)
+
+
+class ArgumentSummary(object):
+    """
+    The identifier of an argument standing for the arguments collapsed by
+    :meth:`ArgumentSet.lod`
+    """
+
+    def __init__(self, count, max_weight):
+        self.count = count
+        self.max_weight = max_weight
+
+    def __str__(self):
+        return '+{} argument{} (max weight {})'.format(
+            self.count, '' if self.count == 1 else 's', self.max_weight)
+
+    def __repr__(self):
+        return self.__str__()
+
+
 class ArgumentSet(object):
     """
     An ``ArgumentSet`` is modeled as a dependency graph where vertices represent
     the components of an argument. A vertex corresponding to the conclusion
     of an argument *A* will **depend on** the premises and exceptions in *A*.
 
-    The graph is built using the `igraph <http://igraph.org/>`_ library. This
-    allows *attributes* to be associated with both vertices and edges.
-    Attributes are represented as Python dictionaries where the key (which
-    must be a string) is the name of the attribute and the value is the
-    attribute itself. For more details, see the
-    `igraph tutorial\
-    <http://igraph.org/python/doc/tutorial/tutorial.html#setting-and-retrieving-attributes>`_.
+    The vertices and edges are kept in plain lists, with the attributes
+    ``prop``, ``arg``, ``claimer`` and ``state`` for each vertex and
+    ``is_exception`` for each edge, so that evaluating the arguments does not
+    need any graph library. The :attr:`graph` is only built with the
+    `igraph <http://igraph.org/>`_ library when it is requested, e.g. to be
+    drawn; the attributes are then those of the vertices and edges of the
+    graph (see the `igraph tutorial\
+    <http://igraph.org/python/doc/tutorial/tutorial.html#setting-and-retrieving-attributes>`_).
     """
 
     def __init__(self):
-        self.graph = Graph()
-        self.graph.to_directed()  # set up as a directed graph
         self.arg_count = 0
         self.arguments = []
+        self.added = set()  # the arguments, to find one in O(1)
+        # vertex attributes, by vertex index
+        self.v_prop = []
+        self.v_arg = []
+        self.v_claimer = []
+        self.v_state = []
+        self.v_argument = []  # the Argument of each argument vertex
+        # edges, with their attribute
+        self.edges = []
+        self.is_exception = []
+        self.out = []  # vertex index -> [index of the targets of its edges]
+        self.prop_vertex = dict()  # proposition -> vertex index
+        self._graph = None  # the igraph Graph, built on request
+
+    def _add_vertex(self, prop=None, arg=None, claimer=None, state=None,
+                    argument=None):
+        self._graph = None
+        self.v_prop.append(prop)
+        self.v_arg.append(arg)
+        self.v_claimer.append(claimer)
+        self.v_state.append(state)
+        self.v_argument.append(argument)
+        self.out.append([])
+        if prop is not None:
+            self.prop_vertex[prop] = len(self.v_prop) - 1
+        return len(self.v_prop) - 1
+
+    def _add_edge(self, source, target, is_exception=False):
+        self._graph = None
+        self.edges.append((source, target))
+        self.is_exception.append(is_exception)
+        self.out[source].append(target)
+
+    @property
+    def graph(self):
+        """
+        The argument set as an igraph ``Graph``, built on first use after a
+        change. Importing igraph is deferred until then.
+        """
+        if self._graph is None:
+            from igraph import Graph
+            g = Graph(n=len(self.v_prop), edges=self.edges, directed=True)
+            if self.v_prop:
+                g.vs['prop'] = self.v_prop
+                g.vs['arg'] = self.v_arg
+                g.vs['claimer'] = self.v_claimer
+                g.vs['state'] = self.v_state
+            if self.edges:
+                g.es['is_exception'] = self.is_exception
+            self._graph = g
+        return self._graph
+
+    @classmethod
+    def build(cls, arguments, claimers=None, states=None):
+        """
+        Build an :class:`ArgumentSet` from a list of arguments in one go.
+        The vertices are created in the same order as repeated calls to
+        :meth:`add_argument` would, without the checks and the logging.
+
+        :parameter arguments: the arguments, in the order they are added
+        :type arguments: list(:class:`Argument`)
+        :parameter claimers: the claimer of each argument
+        :type claimers: list(str) or None
+        :parameter states: the state of the propositions
+        :type states: dict(:class:`PropLiteral`, str) or None
+
+        >>> a, b = PropLiteral('a'), PropLiteral('b')
+        >>> argset = ArgumentSet.build([Argument(a, premises={b}, arg_id='x')],
+        ...                            claimers=['PROPONENT'],
+        ...                            states={a: 'claimed'})
+        >>> argset.graph.vs['prop']
+        [None, a, -a, b]
+        >>> [str(arg) for arg in argset.get_arguments_status('claimed')]
+        ['[b], ~[] => a']
+        """
+        if claimers is None:
+            claimers = [None] * len(arguments)
+        if states is None:
+            states = dict()
+
+        argset = cls()
+        index = argset.prop_vertex
+
+        def vertex(prop):
+            v = index.get(prop)
+            if v is None:
+                v = argset._add_vertex(prop=prop)
+            return v
+
+        for argument, claimer in zip(arguments, claimers):
+            arg_v = argset._add_vertex(
+                arg=argument.arg_id, claimer=claimer, argument=argument)
+            conclusion_v = vertex(argument.conclusion)
+            vertex(argument.conclusion.negate())
+            premise_vs = [vertex(prop) for prop in sorted(argument.premises)]
+            exception_vs = [
+                vertex(prop) for prop in sorted(argument.exceptions)
+            ]
+            argset._add_edge(conclusion_v, arg_v)
+            for target in premise_vs:
+                argset._add_edge(arg_v, target)
+            for target in exception_vs:
+                argset._add_edge(arg_v, target, is_exception=True)
+
+        for prop, state in states.items():
+            if prop in index:
+                argset.v_state[index[prop]] = state
+
+        argset.arguments = list(arguments)
+        argset.added = set(arguments)
+        argset.arg_count = len(argset.arguments)
+        return argset
 
     def propset(self):
         """
@@ -1240,13 +2193,7 @@ class ArgumentSet(object):
         sets a value for the ``prop`` attribute in vertices created when a
         new proposition is added to the graph.
         """
-        g = self.graph
-        props = set()
-        try:
-            props = {p for p in g.vs['prop']}
-        except KeyError:
-            pass
-        return props
+        return set(self.v_prop)
 
     def add_proposition(self, proposition, state=None):
         """
@@ -1254,23 +2201,22 @@ class ArgumentSet(object):
 
         :param proposition: The proposition to be added to the graph.
         :type proposition: :class:`PropLiteral`
-        :return: The graph vertex corresponding to the proposition.
-        :rtype: :class:`Graph.Vertex`
+        :return: The index of the vertex of the proposition.
+        :rtype: int
         :raises TypeError: if the input is not a :class:`PropLiteral`.
         """
         if isinstance(proposition, PropLiteral):
-            if proposition in self.propset():
+            if proposition in self.prop_vertex:
                 logging.debug("Proposition '{}' is already in graph".format(
                     proposition))
+                return self.prop_vertex[proposition]
 
-            else:
-                # add the proposition as a vertex attribute, recovered via the
-                # key 'prop'
-                self.graph.add_vertex(prop=proposition, state=state)
-                logging.debug("Added proposition '{}' to graph with state {}".
-                              format(proposition, state))
-            # return the vertex
-            return self.graph.vs.select(prop=proposition)[0]
+            # add the proposition as a vertex attribute, recovered via the
+            # key 'prop'
+            vertex = self._add_vertex(prop=proposition, state=state)
+            logging.debug("Added proposition '{}' to graph with state {}".
+                          format(proposition, state))
+            return vertex
 
         else:
             raise TypeError('Input {} should be PropLiteral'.format(
@@ -1295,21 +2241,20 @@ class ArgumentSet(object):
         :parameter arg_id: The ID of the argument
         :type arg_id: str or None
         """
-        g = self.graph
-        if argument in self.arguments:
+        if argument in self.added:
             raise ValueError('"{}" is already in the argument set'.format(
                 argument))
         self.arguments.append(argument)  # store a list of arguments
+        self.added.add(argument)
         self.arg_count += 1  # keep track of the number of arguments
         # -----------------------------------------------------------
         #   VERTICES
         # -----------------------------------------------------------
         # add the arg_id as a vertex attribute, recovered via the 'arg' key
-        self.graph.add_vertex(arg=argument.arg_id, claimer=claimer)
+        arg_v = self._add_vertex(
+            arg=argument.arg_id, claimer=claimer, argument=argument)
         logging.info('Added argument \'{}\' to graph by \'{}\''.format(
             argument.arg_id, claimer))
-        # returns the vertex that goes to the argument
-        arg_v = g.vs.select(arg=argument.arg_id)[0]
         # add proposition vertices to the graph
         # conclusion:
         if state is not None:
@@ -1328,16 +2273,55 @@ class ArgumentSet(object):
         # -----------------------------------------------------------
         #   EDGES
         # -----------------------------------------------------------
-        # add new edges to the graph
         # add edge from conclusion to argument
-        g.add_edge(conclusion_v.index, arg_v.index, is_exception=False)
+        self._add_edge(conclusion_v, arg_v)
         # add edges from argument to the premise and exceptions
         for target in premise_vs:
-            g.add_edge(arg_v.index, target.index, is_exception=False)
+            self._add_edge(arg_v, target)
         for target in exception_vs:
-            g.add_edge(arg_v.index, target.index, is_exception=True)
+            self._add_edge(arg_v, target, is_exception=True)
         return
 
+    def truncate(self, count):
+        """
+        Remove the arguments added after the first :param: count ones, and
+        everything added to the graph with them, as if they had never been
+        added (e.g. to add other arguments instead)
+
+        >>> a, b, c = PropLiteral('a'), PropLiteral('b'), PropLiteral('c')
+        >>> argset = ArgumentSet()
+        >>> argset.add_argument(Argument(a, premises={b}, arg_id='arg1'))
+        >>> argset.add_argument(Argument(b, premises={c}, arg_id='arg2'))
+        >>> argset.truncate(1)
+        >>> argset.v_prop
+        [None, a, -a, b]
+        >>> argset.get_arguments(b)
+        []
+        """
+        if count >= len(self.arguments):
+            return
+        self._graph = None
+        # the vertices and edges are added in order: those of the arguments
+        # removed come after the vertex of the first one
+        first = self.v_argument.index(self.arguments[count])
+        edges = len(self.edges)
+        while edges and max(self.edges[edges - 1]) >= first:
+            edges -= 1
+            source, target = self.edges[edges]
+            if source < first:
+                self.out[source].pop()
+        for prop in self.v_prop[first:]:
+            if prop is not None:
+                del self.prop_vertex[prop]
+        for attribute in (self.v_prop, self.v_arg, self.v_claimer,
+                          self.v_state, self.v_argument, self.out):
+            del attribute[first:]
+        del self.edges[edges:]
+        del self.is_exception[edges:]
+        self.added.difference_update(self.arguments[count:])
+        del self.arguments[count:]
+        self.arg_count = count
+
     def get_arguments(self, proposition):
         """
         Find the arguments for a proposition in an *ArgumentSet*.
@@ -1350,28 +2334,14 @@ class ArgumentSet(object):
         :raises ValueError: if the input :class:`PropLiteral` isn't present\
         in the graph.
         """
-        g = self.graph
-
-        # index of vertex associated with the proposition
-        vs = g.vs.select(prop=proposition)
-
-        try:
-            conc_v_index = vs[0].index
-            # IDs of vertices reachable in one hop from the proposition's
-            # vertex (i.e. the argument vertices)
-            target_IDs = [e.target for e in g.es.select(_source=conc_v_index)]
-            # the vertices indexed by target_IDs
-            out_vs = [g.vs[i] for i in target_IDs]
-
-            # a list of argument id that is connected to the conclusion
-            arg_IDs = [v['arg'] for v in out_vs]
-            # return the arguments
-            args = [arg for arg in self.arguments if arg.arg_id in arg_IDs]
-            return args
-
-        except IndexError:
+        conc_v = self.prop_vertex.get(proposition)
+        if conc_v is None:
             raise ValueError("Proposition '{}' is not in the current graph".
                              format(proposition))
+        # the vertices reachable in one hop from the proposition's vertex are
+        # the argument vertices; sorted, they are in the order the arguments
+        # were added
+        return [self.v_argument[v] for v in sorted(self.out[conc_v])]
 
     def get_arguments_con(self, proposition):
         """
@@ -1393,19 +2363,12 @@ class ArgumentSet(object):
         if str(status) != 'claimed' and str(status) != 'questioned':
             raise ValueError('{} is not a valid status'.format(status))
         else:
-            vs = self.graph.vs.select(state=status)
-            try:
-                conc_v_index = vs[0].index
-            except IndexError:
-                return []
-
             args = []
-            for i in vs.indices:
+            for prop, state in zip(self.v_prop, self.v_state):
                 # iterate through the conclusion vertices and call
                 # get_arguments to find the Arguments
-                concl = self.graph.vs[i]['prop']
-                args_concl = self.get_arguments(concl)
-                args.extend(args_concl)
+                if state == status:
+                    args.extend(self.get_arguments(prop))
 
         logging.debug('found args with status "{}": {}'.format(
             status, [str(arg) for arg in args]))
@@ -1418,43 +2381,239 @@ class ArgumentSet(object):
         if str(claimer) != 'PROPONENT' and str(claimer) != 'RESPONDENT':
             raise ValueError('{} is not a valid claimer'.format(claimer))
         else:
-            # this is an verticeset of argument ID
-            vs = self.graph.vs.select(claimer=claimer)
-            args = []
-            for v in vs.indices:
-                arg_id = self.graph.vs[v]['arg']
-                args.extend(
-                    [arg for arg in self.arguments if arg.arg_id == arg_id])
-            return args
+            return [
+                argument
+                for argument, by in zip(self.v_argument, self.v_claimer)
+                if by == claimer
+            ]
 
     def set_argument_status(self, concl, state):
         """
         Update the status of the argument's conclusion to either
         {claimed, questioned}
         """
-        self.graph.vs.select(prop=concl)['state'] = state
+        vertex = self.prop_vertex.get(concl)
+        if vertex is not None:
+            self.v_state[vertex] = state
+            self._graph = None
         logging.info('proposition "{}" state updated to "{}"'.format(concl,
                                                                      state))
-        # # DEBUG
-        # for i in self.graph.vs.indices:
-        #     print(self.graph.vs[i])
 
-    def draw(self, g_filename, debug=False):
+    def lod(self, issue=None, max_depth=3, max_arguments=100, expand=()):
+        """
+        A level of detail of the argument set, small enough to be drawn
+        whatever the size of the argument set.
+
+        Starting from :param: issue (by default, the conclusions that are not
+        a premise or an exception of any argument), the arguments pro and con
+        each proposition are kept breadth first. The arguments about a
+        proposition deeper than :param: max_depth arguments, or found once
+        :param: max_arguments arguments are kept, are collapsed with all the
+        arguments below them into a single summary argument, whose
+        identifier is an :class:`ArgumentSummary` with their number and
+        maximum weight. The arguments that are not relevant to the issue are
+        collapsed into a summary without conclusion.
+
+        :param expand: propositions whose arguments are not collapsed because
+        of their depth
+        :rtype: :class:`ArgumentSet` - to be drawn or written to graphviz
+
+        >>> a, b, c, d = [PropLiteral(p) for p in 'abcd']
+        >>> argset = ArgumentSet()
+        >>> argset.add_argument(Argument(a, premises={b}, arg_id='arg1'))
+        >>> argset.add_argument(Argument(b, premises={c}, weight=0.2,
+        ...                              arg_id='arg2'))
+        >>> argset.add_argument(Argument(c.negate(), weight=0.7,
+        ...                              arg_id='arg3'))
+        >>> argset.add_argument(Argument(d, arg_id='arg4'))
+        >>> for arg in argset.lod(issue=a, max_depth=1).arguments:
+        ...     print(arg.arg_id, '|', arg)
+        arg1 | [b], ~[] => a
+        +2 arguments (max weight 0.7) | [], ~[] => b
+        +1 argument (max weight 0) | [], ~[] => None
+        >>> [arg.arg_id for arg in argset.lod(a, 1, expand=[b]).arguments]
+        ['arg1', 'arg2', +1 argument (max weight 0.7), +1 argument (max weight 0)]
+        """
+        concluding = defaultdict(list)  # proposition -> arguments
+        used = set()  # the premises and exceptions
+        for arg in self.arguments:
+            concluding[arg.conclusion].append(arg)
+            used.update(arg.premises)
+            used.update(arg.exceptions)
+        expand = {str(prop) for prop in expand}
+
+        if issue is not None:
+            tops = [issue]
+        else:
+            tops = sorted({
+                arg.conclusion
+                for arg in self.arguments if arg.conclusion not in used and
+                arg.conclusion.negate() not in used
+            })
+
+        done = set()  # the id of the arguments kept or collapsed
+
+        def about(prop):
+            return [
+                arg for arg in concluding[prop] + concluding[prop.negate()]
+                if id(arg) not in done
+            ]
+
+        def collapse(args, conclusion):
+            # collapse the arguments and all the arguments below them
+            count, max_weight = 0, 0
+            stack = list(args)
+            for arg in args:
+                done.add(id(arg))
+            while stack:
+                arg = stack.pop()
+                count += 1
+                max_weight = max(max_weight, arg.weight)
+                for prop in arg.premises | arg.exceptions:
+                    for below in about(prop):
+                        done.add(id(below))
+                        stack.append(below)
+            return Argument(
+                conclusion,
+                weight=max_weight,
+                arg_id=ArgumentSummary(count, max_weight))
+
+        kept = []
+        seen = set()
+        queue = deque((top, 0) for top in tops)
+        while queue:
+            prop, depth = queue.popleft()
+            if prop in seen:
+                continue
+            seen.update((prop, prop.negate()))
+            args = about(prop)
+            if not args:
+                continue
+            too_deep = depth >= max_depth and str(prop) not in expand and \
+                str(prop.negate()) not in expand
+            if too_deep or len(kept) + len(args) > max_arguments:
+                kept.append(collapse(args, prop))
+                continue
+            for arg in args:
+                done.add(id(arg))
+                kept.append(arg)
+                for below in sorted(arg.premises) + sorted(arg.exceptions):
+                    queue.append((below, depth + 1))
+
+        claimer = {
+            arg_id: by
+            for arg_id, by in zip(self.v_arg, self.v_claimer)
+            if arg_id is not None
+        }
+        states = {
+            prop: state
+            for prop, state in zip(self.v_prop, self.v_state)
+            if prop is not None and state is not None
+        }
+        lod = ArgumentSet.build(kept, [claimer.get(arg.arg_id) for arg in kept],
+                                states)
+
+        rest = [arg for arg in self.arguments if id(arg) not in done]
+        if rest:
+            max_weight = max(arg.weight for arg in rest)
+            summary = Argument(
+                None,
+                weight=max_weight,
+                arg_id=ArgumentSummary(len(rest), max_weight))
+            lod._add_vertex(arg=summary.arg_id, argument=summary)
+            lod.arguments.append(summary)
+            lod.added.add(summary)
+            lod.arg_count += 1
+        return lod
+
+    def fingerprint(self, *extra):
+        """
+        A hash of everything that is drawn of the graph: the vertices with
+        their state and claimer, the edges and the weights of the arguments.
+        Two argument sets with the same fingerprint are rendered the same.
+
+        :param extra: additional values to hash, e.g. the output format
+
+        >>> a = PropLiteral('a')
+        >>> argset1, argset2 = ArgumentSet(), ArgumentSet()
+        >>> argset1.add_argument(Argument(a, weight=0.5, arg_id='arg1'))
+        >>> argset2.add_argument(Argument(a, weight=0.5, arg_id='arg1'))
+        >>> argset1.fingerprint() == argset2.fingerprint()
+        True
+        >>> argset1.set_argument_status(a, 'claimed')
+        >>> argset1.fingerprint() == argset2.fingerprint()
+        False
+        """
+        h = hashlib.sha256()
+        for value in extra:
+            h.update(repr(value).encode())
+        h.update(b'\0')
+        for vertex in zip(self.v_prop, self.v_arg, self.v_state,
+                          self.v_claimer):
+            h.update(repr(tuple(map(repr, vertex))).encode())
+        h.update(b'\0')
+        for edge, is_exception in zip(self.edges, self.is_exception):
+            h.update(repr((edge, is_exception)).encode())
+        h.update(b'\0')
+        for arg in self.arguments:
+            h.update(repr(arg.weight).encode())
+        return h.hexdigest()
+
+    def layout(self, layout_cache):
+        """
+        The position of the vertices of the graph, placed by :param:
+        layout_cache (see :class:`LayoutCache`), which keeps them for the
+        next graph laid out
+
+        :rtype: list - the [x, y] of each vertex
+        """
+        g = self.graph
+        roots = [i for i, degree in enumerate(g.indegree()) if degree == 0]
+        keys = [('prop', str(p)) if a is None else ('arg', str(a))
+                for p, a in zip(self.v_prop, self.v_arg)]
+        return layout_cache.layout(g, keys, roots).coords
+
+    def draw(self,
+             g_filename,
+             debug=False,
+             cache=None,
+             layout_cache=None,
+             layout=None):
         """
         Visualise an :class:`ArgumentSet` as a labeled graph.
-        This uses the pycairo and python-igraph module.
+        This uses the pycairo and python-igraph module, which are only
+        imported here.
 
         :parameter debug: If :class:`True`, add the vertex index to the label.
-        """
+        :parameter cache: If a :class:`RenderCache` is given, the graph is
+        only drawn if it is not in the cache yet.
+        :parameter layout_cache: If a :class:`LayoutCache` is given, the
+        vertices keep the position they had when it was last used, and only
+        the new vertices are placed.
+        :parameter layout: The position of the vertices, as returned by
+        :meth:`layout`, instead of a :param: layout_cache.
+        """
+        if layout is None and layout_cache is not None:
+            # even if the graph is cached, so that the next one is laid out
+            # from these positions
+            layout = self.layout(layout_cache)
+        if cache is not None:
+            key = self.fingerprint('draw', os.path.splitext(g_filename)[1],
+                                   debug, layout)
+            if cache.fetch(key, g_filename):
+                return
+        elif os.path.isfile(g_filename):
+            # the file may be a link to a cached graph; replace it
+            os.unlink(g_filename)
+        from igraph import Layout, plot
         g = self.graph
 
-        # labels for nodes that are classed as propositions
-        labels = g.vs['prop']
-
-        # insert the labels for nodes that are classed as arguments
-        for i in range(len(labels)):
-            if g.vs['arg'][i] is not None:
-                labels[i] = g.vs['arg'][i]
+        # labels for nodes that are classed as propositions, or else as
+        # arguments
+        labels = [
+            prop if arg is None else arg
+            for prop, arg in zip(self.v_prop, self.v_arg)
+        ]
 
         if debug:
             d_labels = []
@@ -1464,9 +2623,14 @@ class ArgumentSet(object):
 
         g.vs['label'] = labels
 
-        roots = [i for i in range(len(g.vs)) if g.indegree()[i] == 0]
-        ALL = 3  # from igraph
-        layout = g.layout_reingold_tilford(mode=ALL, root=roots)
+        if layout is not None:
+            layout = Layout(layout)
+        else:
+            roots = [
+                i for i, degree in enumerate(g.indegree()) if degree == 0
+            ]
+            ALL = 3  # from igraph
+            layout = g.layout_reingold_tilford(mode=ALL, root=roots)
 
         plot_style = {}
         # for vertexes
@@ -1475,7 +2639,9 @@ class ArgumentSet(object):
         plot_style['vertex_color'] = []
         # plot_style['vertex_color'] = \
         #     ['lightblue' if x is None else 'pink' for x in g.vs['arg']]
-        counter = 0
+        # the weights by argument, as the vertices of the arguments may not
+        # be in the same order as the arguments
+        weights = {arg.arg_id: arg.weight for arg in self.arguments}
         for i, x in enumerate(g.vs['arg']):
             if x is None:  # if it is an arguments
                 # By argument status = 'claimed' or 'questioned':
@@ -1488,11 +2654,9 @@ class ArgumentSet(object):
                     plot_style['vertex_color'].append('gray')
             else:
                 # darker red = larger weight
-                how_red = [1, 1 - self.arguments[counter].weight, 0.5]
+                how_red = [1, 1 - weights[x], 0.5]
                 # By argument status = 'claimed' or 'questioned':
                 plot_style['vertex_color'].append(how_red)
-                by = g.vs[i]['claimer']
-                counter += 1
 
         plot_style['vertex_shape'] = \
             ['circular' if g.vs[x]['arg'] is None else 'diamond' if g.vs[x]['claimer'] == 'PROPONENT' else 'rect' for x in g.vs.indices]
@@ -1511,77 +2675,389 @@ class ArgumentSet(object):
         plot_style['layout'] = layout
         # execute the plot
         plot(g, g_filename, autocurve=True, **plot_style)
+        if cache is not None:
+            cache.store(key, g_filename)
         return
 
-    def write_to_graphviz(self, fname=None):
-        g = self.graph
-        result = "digraph G{ \n"
-        counter = 0
-
-        for vertex in g.vs:
-            arg_label = vertex.attributes()['arg']
-            prop_label = vertex.attributes()['prop']
-
-            # If the vertex is an argument
-            if arg_label:
-                arg_weight = self.arguments[counter].weight
-                # higher weights = darker color
-                if arg_weight <= 0.2:
-                    color = 'coral'
-                elif arg_weight <= 0.4 and arg_weight > 0.2:
-                    color = 'coral1'
-                elif arg_weight <= 0.6 and arg_weight > 0.4:
-                    color = 'coral2'
-                elif arg_weight <= 0.8 and arg_weight > 0.6:
-                    color = 'coral3'
-                else:
-                    color = 'coral4'
-                arg_label = "\\n".join(
-                    wrap(repr(arg_label), 40))  # wrap at length
-                dot_str = ('"{}"'.format(arg_label) +
-                           ' [color="black", fillcolor="{}",'.format(color) +
-                           'fixedsize=false, shape=box, style="filled"]; \n')
-                counter += 1
-
-            # if the vertex is a proposition
-            elif prop_label:
-                prop_label = "\\n".join(wrap(repr(prop_label), 40))
-                dot_str = ('"{}"'.format(prop_label) +
-                           ' [color="black", fillcolor="lightblue", '
-                           'fixedsize=false,  shape="box", '
-                           'style="rounded,filled"]; \n')
-            result += dot_str
-
-        for edge in g.es:
-            source_label = g.vs[edge.source]['prop'] if\
-                g.vs[edge.source]['prop'] else g.vs[edge.source]['arg']
-            target_label = g.vs[edge.target]['prop'] if\
-                g.vs[edge.target]['prop'] else g.vs[edge.target]['arg']
-            source_label = "\\n".join(wrap(repr(source_label), 40))
-            target_label = "\\n".join(wrap(repr(target_label), 40))
-            # if edge is an exception, use a dot instead of arrow
-            if edge.attributes()['is_exception']:
-                result += '"{}" -> "{}" [arrowhead=dot]'.format(source_label,
-                                                                target_label)
-            else:
-                result += '"{}" -> "{}"'.format(source_label, target_label)
-            dot_str = " ; \n"
-            result += dot_str
-
-        result += "}"
-
+    def write_to_graphviz(self, fname=None, cache=None):
         # Write to file
         if fname is None:
             fname = 'graph.dot'
 
-        with open(fname, 'w') as f:
-            print(result, file=f)
+        if cache is not None:
+            key = self.fingerprint('write_to_graphviz', 2)
+            if cache.fetch(key, fname):
+                return
+        elif os.path.isfile(fname):
+            # the file may be a link to a cached graph; replace it
+            os.unlink(fname)
+
+        # the weights by argument, as the vertices of the arguments may not
+        # be in the same order as the arguments
+        weights = {arg.arg_id: arg.weight for arg in self.arguments}
+        arg_labels = self.v_arg
+        prop_labels = self.v_prop
+
+        with open(fname, 'w', buffering=1 << 16) as f:
+            f.write('digraph G{\n')
+            # the vertices are identified by their index, and each label is
+            # formatted once
+            for i, (arg_label, prop_label) in enumerate(
+                    zip(arg_labels, prop_labels)):
+                if arg_label is not None:
+                    arg_weight = weights[arg_label]
+                    # higher weights = darker color
+                    if arg_weight <= 0.2:
+                        color = 'coral'
+                    elif arg_weight <= 0.4:
+                        color = 'coral1'
+                    elif arg_weight <= 0.6:
+                        color = 'coral2'
+                    elif arg_weight <= 0.8:
+                        color = 'coral3'
+                    else:
+                        color = 'coral4'
+                    f.write('n{} [label="{}", color="black", fillcolor="{}", '
+                            'fixedsize=false, shape=box, style="filled"];\n'.
+                            format(i, dot_label(arg_label), color))
+                else:
+                    f.write('n{} [label="{}", color="black", '
+                            'fillcolor="lightblue", fixedsize=false, '
+                            'shape="box", style="rounded,filled"];\n'.format(
+                                i, dot_label(prop_label)))
+
+            for (source, target), is_exception in zip(
+                    self.edges, self.is_exception):
+                # if edge is an exception, use a dot instead of arrow
+                if is_exception:
+                    f.write('n{} -> n{} [arrowhead=dot];\n'.format(
+                        source, target))
+                else:
+                    f.write('n{} -> n{};\n'.format(source, target))
+            f.write('}\n')
+        if cache is not None:
+            cache.store(key, fname)
         return
 
 
 # ========================================================================
 
 
+class ArgumentSetVersion(object):
+    """
+    An immutable version of an :class:`ArgumentSetView`, sharing its
+    structure. It supports the queries of :class:`ArgumentSet` used by the
+    dialogue and by :class:`CAES`, and can be turned back into an
+    :class:`ArgumentSet` to be drawn.
+    """
+
+    def __init__(self, argset, arg_count, prop_count, version):
+        self._argset = argset
+        self.arg_count = arg_count
+        self.prop_count = prop_count
+        self.version = version
+        self._arguments = None
+
+    @property
+    def arguments(self):
+        # copied on first use only, so that taking a snapshot stays O(1)
+        if self._arguments is None:
+            self._arguments = tuple(self._argset.arguments[:self.arg_count])
+        return self._arguments
+
+    def state(self, proposition):
+        """
+        The state of :param: proposition in this version
+        """
+        try:
+            versions, states = self._argset.states[proposition]
+        except KeyError:
+            return None
+        i = bisect_right(versions, self.version)
+        return states[i - 1] if i else None
+
+    def propset(self):
+        return set(self._argset.props[:self.prop_count])
+
+    def get_arguments(self, proposition):
+        """
+        Find the arguments for a proposition in this version.
+
+        :raises ValueError: if the proposition is not in this version
+        """
+        index = self._argset.prop_index.get(proposition)
+        if index is None or index >= self.prop_count:
+            raise ValueError("Proposition '{}' is not in the current graph".
+                             format(proposition))
+        return [
+            self._argset.arguments[i]
+            for i in self._argset.concluding.get(proposition, [])
+            if i < self.arg_count
+        ]
+
+    def get_arguments_con(self, proposition):
+        return self.get_arguments(proposition.negate())
+
+    def get_arguments_status(self, status):
+        """
+        Find the arguments whose conclusion is of status `claimed` or
+        `questioned` in this version
+        """
+        if str(status) != 'claimed' and str(status) != 'questioned':
+            raise ValueError('{} is not a valid status'.format(status))
+        args = []
+        for prop in self._argset.props[:self.prop_count]:
+            if self.state(prop) == status:
+                args.extend(self.get_arguments(prop))
+        return args
+
+    def get_arguments_claimer(self, claimer):
+        """
+        Get arguments made by the claimer - either 'PROPONENT' or 'RESPONDENT'
+        """
+        if str(claimer) != 'PROPONENT' and str(claimer) != 'RESPONDENT':
+            raise ValueError('{} is not a valid claimer'.format(claimer))
+        claimers = self._argset.claimers[:self.arg_count]
+        return [
+            arg for arg, by in zip(self.arguments, claimers) if by == claimer
+        ]
+
+    def to_argset(self):
+        """
+        Build an :class:`ArgumentSet` holding this version, e.g. to draw it
+        """
+        states = dict()
+        for prop in self._argset.props[:self.prop_count]:
+            state = self.state(prop)
+            if state is not None:
+                states[prop] = state
+        return ArgumentSet.build(self.arguments,
+                                 self._argset.claimers[:self.arg_count],
+                                 states)
+
+    def lod(self, *args, **kwargs):
+        return self.to_argset().lod(*args, **kwargs)
+
+    def draw(self,
+             g_filename,
+             debug=False,
+             cache=None,
+             layout_cache=None,
+             layout=None):
+        self.to_argset().draw(
+            g_filename,
+            debug=debug,
+            cache=cache,
+            layout_cache=layout_cache,
+            layout=layout)
+
+    def write_to_graphviz(self, fname=None, cache=None):
+        self.to_argset().write_to_graphviz(fname, cache=cache)
+
+
+class ArgumentSetView(object):
+    """
+    A view over a master :class:`ArgumentSet` holding the arguments that are
+    *in play*, e.g. in a dialogue.
+
+    The view shares the arguments and propositions of the master argument
+    set instead of adding them to a graph of its own. It only keeps
+    append-only indices of the propositions, arguments and claimers in play,
+    and a history of the state of each proposition. Adding an argument
+    appends to these indices, and a :meth:`snapshot` is O(1): it only records
+    their current sizes and the current version, and shares them with the view
+    (and all the other snapshots).
+
+    These indices are the view's own rather than a mask over the adjacency of
+    the master argument set: a snapshot must answer its queries with only the
+    arguments in play at its version, in the order they were put forth, which
+    a prefix of an append-only list gives and the master (in its own order,
+    with the arguments in play now) does not.
+
+    >>> a, b, c = PropLiteral('a'), PropLiteral('b'), PropLiteral('c')
+    >>> master = ArgumentSet()
+    >>> arg1 = Argument(a, premises={b}, arg_id='arg1')
+    >>> arg2 = Argument(b, premises={c}, arg_id='arg2')
+    >>> master.add_argument(arg1); master.add_argument(arg2)
+    >>> view = ArgumentSetView(master)
+    >>> view.add_argument(arg2, state='claimed', claimer='PROPONENT')
+    >>> [str(arg) for arg in view.get_arguments(b)]
+    ['[c], ~[] => b']
+    >>> view.get_arguments(a)
+    Traceback (most recent call last):
+    ...
+    ValueError: Proposition 'a' is not in the current graph
+    >>> try: view.add_argument(arg2)
+    ... except ValueError: print('already in play')
+    already in play
+    >>> g = view.graph
+    >>> view.graph is g
+    True
+    >>> view.set_argument_status(b, 'questioned')
+    >>> view.graph is g
+    False
+    """
+
+    def __init__(self, master):
+        self.master = master
+        self.version = 0
+        self.arguments = []  # the arguments in play, in the order added
+        self.added = set()  # the arguments in play, to find one in O(1)
+        self.arg_count = 0
+        self.claimers = []  # the claimer of each argument in play
+        self.props = []  # propositions in play, in the order added
+        self.prop_index = dict()  # proposition -> position in props
+        self.concluding = dict()  # proposition -> [index of arguments pro]
+        self.states = dict()  # proposition -> ([version], [state])
+        self.changes = []  # (proposition, state) in the order they are made
+        self._graph = None  # the graph of :attr:`graph`, until a change
+
+    def _add_proposition(self, proposition, state=None):
+        if proposition not in self.prop_index:
+            self.prop_index[proposition] = len(self.props)
+            self.props.append(proposition)
+            if state is not None:
+                self._record_state(proposition, state)
+
+    def _record_state(self, proposition, state):
+        self._graph = None
+        self.version += 1
+        versions, states = self.states.setdefault(proposition, ([], []))
+        versions.append(self.version)
+        states.append(state)
+        self.changes.append((proposition, state))
+
+    def add_argument(self, argument, state=None, claimer=None):
+        """
+        Put an argument of the master argument set in play. As in
+        :meth:`ArgumentSet.add_argument`, the state is only given to the
+        conclusion if it is not in play yet.
+
+        :raises ValueError: if the argument is not in the master argument set\
+        or is already in play
+        """
+        if argument not in self.master.added:
+            raise ValueError('"{}" is not in the master argument set'.format(
+                argument))
+        if argument in self.added:
+            raise ValueError('"{}" is already in the argument set'.format(
+                argument))
+        self.added.add(argument)
+        self._graph = None
+
+        if state is not None:
+            assert state == 'claimed' or state == 'questioned'
+        self.concluding.setdefault(argument.conclusion,
+                                   []).append(len(self.arguments))
+        self.arguments.append(argument)
+        self.claimers.append(claimer)
+        self.arg_count += 1
+        logging.info('Added argument \'{}\' to graph by \'{}\''.format(
+            argument.arg_id, claimer))
+
+        self._add_proposition(argument.conclusion, state=state)
+        self._add_proposition(argument.conclusion.negate())
+        for prop in sorted(argument.premises):
+            self._add_proposition(prop)
+        for prop in sorted(argument.exceptions):
+            self._add_proposition(prop)
+
+    def set_argument_status(self, concl, state):
+        """
+        Update the status of the argument's conclusion to either
+        {claimed, questioned}
+        """
+        if concl in self.prop_index:
+            self._record_state(concl, state)
+        logging.info('proposition "{}" state updated to "{}"'.format(concl,
+                                                                     state))
+
+    def state(self, proposition):
+        """
+        The current state of :param: proposition
+        """
+        try:
+            return self.states[proposition][1][-1]
+        except KeyError:
+            return None
+
+    def snapshot(self):
+        """
+        The current version of the view, as an immutable
+        :class:`ArgumentSetVersion`
+
+        >>> a, b = PropLiteral('a'), PropLiteral('b')
+        >>> arg1 = Argument(a, premises={b}, arg_id='arg1')
+        >>> arg2 = Argument(b, arg_id='arg2')
+        >>> master = ArgumentSet()
+        >>> master.add_argument(arg1); master.add_argument(arg2)
+        >>> view = ArgumentSetView(master)
+        >>> view.add_argument(arg1, state='claimed', claimer='PROPONENT')
+        >>> first = view.snapshot()
+        >>> view.add_argument(arg2, state='claimed', claimer='RESPONDENT')
+        >>> view.set_argument_status(a, 'questioned')
+        >>> [str(arg) for arg in first.get_arguments_status('claimed')]
+        ['[b], ~[] => a']
+        >>> second = view.snapshot()
+        >>> [str(arg) for arg in second.get_arguments_status('claimed')]
+        []
+        >>> [str(arg) for arg in second.get_arguments_status('questioned')]
+        ['[b], ~[] => a']
+        >>> [arg.arg_id for arg in first.get_arguments_claimer('RESPONDENT')]
+        []
+        """
+        return ArgumentSetVersion(self,
+                                  len(self.arguments),
+                                  len(self.props), self.version)
+
+    def propset(self):
+        return set(self.props)
+
+    def get_arguments(self, proposition):
+        return self.snapshot().get_arguments(proposition)
+
+    def get_arguments_con(self, proposition):
+        return self.get_arguments(proposition.negate())
+
+    def get_arguments_status(self, status):
+        return self.snapshot().get_arguments_status(status)
+
+    def get_arguments_claimer(self, claimer):
+        return self.snapshot().get_arguments_claimer(claimer)
+
+    @property
+    def graph(self):
+        """
+        The graph of the arguments in play, built on request and kept until
+        the view changes
+        """
+        if self._graph is None:
+            self._graph = self.snapshot().to_argset().graph
+        return self._graph
+
+    def lod(self, *args, **kwargs):
+        return self.snapshot().lod(*args, **kwargs)
+
+    def draw(self,
+             g_filename,
+             debug=False,
+             cache=None,
+             layout_cache=None,
+             layout=None):
+        self.snapshot().draw(
+            g_filename,
+            debug=debug,
+            cache=cache,
+            layout_cache=layout_cache,
+            layout=layout)
+
+    def write_to_graphviz(self, fname=None, cache=None):
+        self.snapshot().write_to_graphviz(fname, cache=cache)
+
+
+# ========================================================================
+
+
 class ProofStandard(object):
     """
     Each proposition in a CAES is associated with a proof standard.
@@ -1648,6 +3124,11 @@ assigns weights to arguments.
 :type weights: dict
 """
 
+IssueResult = namedtuple('IssueResult', ['issue', 'acceptable'])
+"""
+The result of evaluating an issue, see :meth:`Reader.evaluate`
+"""
+
 # ========================================================================
 
 
@@ -1905,6 +3386,345 @@ class CAES(object):
         return self.max_weight_applicable(args)
 
 
+# ========================================================================
+#       BATCH
+# ========================================================================
+
+# the extensions of the case files: the source files, and the JSON files of
+# the cases built by other programs (see :meth:`Reader.build_case`)
+JSON_EXTENSIONS = ('.json', '.ndjson')
+CASE_EXTENSIONS = ('.yml', ) + JSON_EXTENSIONS
+
+FileResult = namedtuple('FileResult',
+                        ['filename', 'ok', 'results', 'error', 'seconds',
+                         'output'])
+"""
+The outcome of :func:`process_file` for one file
+
+:param ok: False if processing the file raised an error, given in `error`
+:param results: the list of :class:`IssueResult` in headless mode without
+dialogue, None otherwise
+:param seconds: the time taken to process the file, None if its worker
+process died before returning it
+:param output: what was printed while processing the file, if captured
+"""
+
+
+def expand_paths(paths, extension=CASE_EXTENSIONS):
+    """
+    The files to process: each directory in :param: paths is replaced by the
+    files with :param: extension it contains, in sorted order
+
+    >>> [f.split('/')[-1] for f in expand_paths(['../../samplesTest'])][:3]
+    ['BOPfailure.yml', 'convergentarg.yml', 'convergentarg2.yml']
+    """
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.endswith(extension))
+        else:
+            filenames.append(path)
+    return filenames
+
+
+def case_name(filename):
+    """
+    The name of a case file, without its folder and extension, after which
+    its log, dot and graph folders are named
+
+    >>> case_name('../../samples/caes_org.yml'), case_name('case.ndjson')
+    ('caes_org', 'case')
+    """
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def log_filename(filename, log_dir='../../log'):
+    """
+    The log file of a case file: the log folder adjacent to `src`, named
+    after the case file
+    """
+    return '{}/{}.log'.format(log_dir, case_name(filename))
+
+
+def new_reader(options, cache=None, lod=None, incremental=False):
+    """
+    A :class:`Reader` set up with the options of the command line, as a dict
+
+    :param cache: the :class:`RenderCache` of the renderer, if any
+    :param lod: the level of detail of the renderer, if any
+    """
+    model_cache = None
+    if options['model_cache'] is not None:
+        model_cache = ModelCache(options['model_cache'])
+    return Reader(
+        buffer_size=options['buffer_size'],
+        indent_size=options['indent_size'],
+        use_mmap=options['use_mmap'],
+        model_cache=model_cache,
+        incremental=incremental,
+        parse_workers=options['parse_workers'],
+        renderer=Renderer(
+            workers=options['render_workers'],
+            processes=options['render_processes'],
+            cache=cache,
+            lod=lod))
+
+
+def process_file(filename,
+                 options,
+                 cache=None,
+                 lod=None,
+                 capture=False,
+                 reader=None):
+    """
+    Load and evaluate one case file with its own :class:`Reader`, logging to
+    its own log file (or to stderr in headless mode).
+
+    :param options: the options of the command line, as a dict
+    :param cache: the :class:`RenderCache` of the renderer, if any
+    :param lod: the level of detail of the renderer, if any
+    :param capture: keep what is printed in :attr:`FileResult.output`
+    instead of printing it, e.g. in a worker process
+    :param reader: the :class:`Reader` of the file, e.g. to keep it from one
+    change of the file to the next; a new one by default
+    :rtype: :class:`FileResult`
+    """
+    logger_file = log_filename(filename)
+    if options['headless']:
+        handler = logging.StreamHandler(sys.stderr)
+    else:
+        handler = logging.FileHandler(logger_file, mode='w')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    root = logging.getLogger()
+    root.setLevel(options['logger'])
+    root.addHandler(handler)
+
+    stdout = io.StringIO() if capture else sys.stdout
+    start = time.perf_counter()
+    results, error = None, None
+    try:
+        with redirect_stdout(stdout):
+            logging.info('Imported caes in {:.1f} ms'.format(
+                IMPORT_TIME * 1000))
+            print('\nProcessing {}'.format(filename))
+            if not os.path.isfile(filename):
+                raise ReaderError('{} is not a file'.format(filename))
+
+            event_log = checkpoint = None
+            if options['event_log']:
+                event_log = logger_file[:-4] + '.ndjson'
+            if options['checkpoint']:
+                checkpoint = logger_file[:-4] + '.ckpt'
+            if reader is None:
+                reader = new_reader(options, cache, lod)
+
+            results = reader.load(
+                filename,
+                dialogue=options['dialogue'],
+                event_log=event_log,
+                checkpoint=checkpoint,
+                resume=options['checkpoint'],
+                headless=options['headless'],
+                render_turns=options['render_turns'])
+            if options['graph_file']:
+                reader.write_graph(logger_file[:-4] + '.args')
+            if not options['headless'] or options['dialogue']:
+                results = None
+            else:
+                for issue, acceptable in results:
+                    print('"{}" {} acceptable'.format(
+                        issue, ['IS NOT', 'IS'][acceptable]))
+    except Exception as e:
+        logging.exception('Processing {} failed'.format(filename))
+        error = '{}: {}'.format(type(e).__name__, e)
+    finally:
+        root.removeHandler(handler)
+        handler.close()
+
+    return FileResult(filename, error is None, results, error,
+                      time.perf_counter() - start,
+                      stdout.getvalue() if capture else None)
+
+
+def run_batch(filenames, options, cache=None, lod=None, jobs=1):
+    """
+    Process the case files, spread over :param: jobs worker processes if
+    more than 1, see :func:`process_file`. The output of each file is printed
+    once it is done.
+
+    :rtype: list(:class:`FileResult`) - in the order of :param: filenames
+    """
+    if jobs <= 1 or len(filenames) <= 1:
+        return [
+            process_file(filename, options, cache, lod)
+            for filename in filenames
+        ]
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(min(jobs, len(filenames))) as executor:
+        futures = {
+            executor.submit(process_file, filename, options, cache, lod,
+                            True): i
+            for i, filename in enumerate(filenames)
+        }
+        done = [None] * len(filenames)
+        for future in as_completed(futures):
+            filename = filenames[futures[future]]
+            try:
+                result = future.result()
+            except Exception as e:
+                # the worker did not return, e.g. it was killed and the pool
+                # is broken: the file failed, the batch goes on. How long
+                # it ran is unknown, it may have waited for a worker.
+                logging.error('Processing {} failed: {}'.format(filename, e))
+                result = FileResult(filename, False, None, '{}: {}'.format(
+                    type(e).__name__, e), None, '')
+            sys.stdout.write(result.output)
+            done[futures[future]] = result
+    return done
+
+
+def format_summary(results):
+    """
+    The summary table of a batch: the outcome and time taken by each file
+
+    >>> print(format_summary([
+    ...     FileResult('a.yml', True, [IssueResult('i', True),
+    ...                                IssueResult('j', False)], None, 0.25,
+    ...                None),
+    ...     FileResult('b.yml', False, None, 'ReaderError: oops', 1.5, None),
+    ...     FileResult('c.yml', False, None, 'BrokenProcessPool', None, '')]))
+    file   status             issues  time (s)
+    a.yml  ok                 1/2 IS     0.250
+    b.yml  ReaderError: oops       -     1.500
+    c.yml  BrokenProcessPool       -         -
+    3 files, 2 failed, 1.750 s
+    """
+    rows = [('file', 'status', 'issues', 'time (s)')]
+    for result in results:
+        issues = '-'
+        if result.results is not None:
+            issues = '{}/{} IS'.format(
+                sum(1 for r in result.results if r.acceptable),
+                len(result.results))
+        rows.append((result.filename, 'ok' if result.ok else result.error,
+                     issues, '-' if result.seconds is None else
+                     '{:.3f}'.format(result.seconds)))
+    widths = [max(len(row[i]) for row in rows) for i in range(4)]
+    lines = [
+        '{:<{}}  {:<{}}  {:>{}}  {:>{}}'.format(
+            row[0], widths[0], row[1], widths[1], row[2], widths[2], row[3],
+            widths[3]) for row in rows
+    ]
+    lines.append('{} files, {} failed, {:.3f} s'.format(
+        len(results), sum(1 for r in results if not r.ok),
+        sum(r.seconds for r in results if r.seconds is not None)))
+    return '\n'.join(lines)
+
+
+def dot_files(filenames, dot_root='../../dot'):
+    """
+    The dot files written for the case files, in the dot folder of each
+    """
+    paths = []
+    for filename in filenames:
+        dot_dir = '{}/{}/'.format(dot_root, case_name(filename))
+        if os.path.isdir(dot_dir):
+            paths.extend(
+                os.path.join(dot_dir, f) for f in sorted(os.listdir(dot_dir))
+                if f.endswith('.dot'))
+    return paths
+
+
+def file_signature(filename):
+    """
+    The time and size of the last change of a file, or None if it does not
+    exist
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def watch(filenames, options, cache=None, lod=None, interval=0.1, polls=None):
+    """
+    Process the case files, then process each file again every time it
+    changes, until interrupted (or for :param: polls polls of the files).
+
+    Each file keeps its :class:`Reader`, made `incremental`: only the
+    sections of the file that changed are parsed and built again. The graphs
+    are drawn through a :class:`RenderCache`, a temporary one if
+    :param: cache is None, so that only the graphs that changed are drawn
+    again.
+
+    The files are polled every :param: interval seconds, by the time and
+    size of their last change (see :func:`file_signature`).
+
+    >>> import shutil, tempfile
+    >>> tmp = tempfile.mkdtemp()
+    >>> case = os.path.join(tmp, 'case.yml')
+    >>> _ = shutil.copy('../../samplesTest/convergentarg.yml', case)
+    >>> options = dict(headless=True, dialogue=False, logger='ERROR',
+    ...                event_log=False, checkpoint=False, graph_file=False,
+    ...                model_cache=None, buffer_size=4096, indent_size=2,
+    ...                use_mmap=False, render_workers=0,
+    ...                render_processes=False, render_turns=False,
+    ...                graphviz=None, parse_workers=0)
+    >>> with redirect_stdout(io.StringIO()):
+    ...     results = watch([case], options, polls=1)
+    >>> [(str(r.issue), r.acceptable) for r in results[case].results]
+    [('issue', True)]
+    >>> shutil.rmtree(tmp)
+
+    :rtype: dict - the last :class:`FileResult` of each file
+    """
+    temporary = None
+    if cache is None and not options['headless']:
+        import tempfile
+        temporary = tempfile.mkdtemp(prefix='caes-watch-')
+        cache = RenderCache(temporary)
+    readers = {
+        filename: new_reader(options, cache, lod, incremental=True)
+        for filename in filenames
+    }
+    seen = dict.fromkeys(filenames, ())  # the signature processed last
+    results = dict()
+    print('Watching {} file(s), press Ctrl-C to stop'.format(len(filenames)))
+    try:
+        poll = 0
+        while polls is None or poll < polls:
+            changed = []
+            for filename in filenames:
+                signature = file_signature(filename)
+                if signature == seen[filename]:
+                    continue
+                seen[filename] = signature
+                results[filename] = process_file(
+                    filename, options, cache, lod, reader=readers[filename])
+                changed.append(filename)
+            if changed:
+                print(format_summary([results[f] for f in changed]))
+                if options['graphviz'] is not None:
+                    render_dot_files(
+                        dot_files(changed),
+                        options['graphviz'],
+                        workers=max(1, options['render_workers']))
+            poll += 1
+            if polls is None or poll < polls:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if temporary is not None:
+            import shutil
+            shutil.rmtree(temporary, ignore_errors=True)
+    return results
+
+
 # -----------------------------------------------------------------------------
 #       MAIN
 # -----------------------------------------------------------------------------
@@ -1924,14 +3744,128 @@ if __name__ == '__main__':
             'pathname',
             nargs='+',
             default='"../../samples/example.yml"',
-            help='path to each of your .yml file(s). At least one must be given (example: %(default)s)'
+            help='path to each of your .yml (or .json, .ndjson) file(s), or to folder(s) of such files. At least one must be given (example: %(default)s)'
         )
+        argparser.add_argument(
+            '-j',
+            '--jobs',
+            dest='jobs',
+            help='number of worker processes the files are spread over; each file gets its own log (default: %(default)s)',
+            action='store',
+            default=1,
+            type=int)
         argparser.add_argument(
             '-d',
             '--dialogue',
             dest='dialogue',
             help='shows the shifting burden of proof while the arguments are evaluated in CAES. If the flag is used, dialogue mode will be used for all the files',
             action='store_true')
+        argparser.add_argument(
+            '-turns',
+            '--render_turns',
+            dest='render_turns',
+            help='in dialogue mode, render the graph of the dialogue state at each turn instead of only the final graph',
+            action='store_true')
+        argparser.add_argument(
+            '-events',
+            '--event_log',
+            dest='event_log',
+            help='in dialogue mode, stream the turn events as NDJSON to the log folder (as <file>.ndjson) instead of the dot folder',
+            action='store_true')
+        argparser.add_argument(
+            '-checkpoint',
+            '--checkpoint',
+            dest='checkpoint',
+            help='in dialogue mode, checkpoint the dialogue to the log folder (as <file>.ckpt) and resume from an existing checkpoint',
+            action='store_true')
+        argparser.add_argument(
+            '-graph_file',
+            '--graph_file',
+            dest='graph_file',
+            help='also write the arguments built to the log folder as a binary graph file (as <file>.args), which Reader.load_graph evaluates in place',
+            action='store_true')
+        argparser.add_argument(
+            '-headless',
+            '--headless',
+            dest='headless',
+            help='only evaluate the issues and print the results: no graph is drawn, and the log is written to stderr instead of the log folder',
+            action='store_true')
+        argparser.add_argument(
+            '-render_workers',
+            '--render_workers',
+            dest='render_workers',
+            help='number of workers drawing the graphs in the background; 0 draws them right away (default: %(default)s)',
+            action='store',
+            default=1,
+            type=int)
+        argparser.add_argument(
+            '-render_processes',
+            '--render_processes',
+            dest='render_processes',
+            help='draw the graphs in worker processes instead of threads',
+            action='store_true')
+        argparser.add_argument(
+            '-graphviz',
+            '--graphviz',
+            dest='graphviz',
+            help='render the dot files with graphviz to the given format, next to the dot files',
+            choices=DOT_FORMATS,
+            default=None,
+            action='store')
+        argparser.add_argument(
+            '-lod_depth',
+            '--lod_depth',
+            dest='lod_depth',
+            help='collapse the arguments deeper than this number of arguments into summary nodes when drawing large graphs',
+            action='store',
+            default=None,
+            type=int)
+        argparser.add_argument(
+            '-lod_size',
+            '--lod_size',
+            dest='lod_size',
+            help='with -lod_depth, the maximum number of arguments drawn before the others are collapsed (default: %(default)s)',
+            action='store',
+            default=100,
+            type=int)
+        argparser.add_argument(
+            '-render_cache',
+            '--render_cache',
+            dest='render_cache',
+            help='directory of the graphs already rendered, which are reused instead of being rendered again',
+            action='store',
+            default=None,
+            type=str)
+        argparser.add_argument(
+            '-render_cache_size',
+            '--render_cache_size',
+            dest='render_cache_size',
+            help='maximum size of the render cache in MB (default: %(default)s)',
+            action='store',
+            default=256,
+            type=int)
+        argparser.add_argument(
+            '-model_cache',
+            '--model_cache',
+            dest='model_cache',
+            help='directory of the models built from the .yml files, which are reused while the files do not change',
+            action='store',
+            default=None,
+            type=str)
+        argparser.add_argument(
+            '-watch',
+            '--watch',
+            dest='watch',
+            help='keep running, and process each file again every time it is saved: only the sections that changed are parsed again, and only the graphs that changed are drawn again',
+            action='store_true')
+        argparser.add_argument(
+            '-watch_interval',
+            '--watch_interval',
+            dest='watch_interval',
+            help='with -watch, the number of seconds between two checks of the files (default: %(default)s)',
+            action='store',
+            default=0.1,
+            type=float)
         argparser.add_argument(
             '-logger',
             dest='logger',
@@ -1949,6 +3883,20 @@ if __name__ == '__main__':
             action='store',
             default=4096,
             type=int)
+        argparser.add_argument(
+            '-mmap',
+            '--use_mmap',
+            dest='use_mmap',
+            help='map the .yml files in memory instead of reading them through the buffer, e.g. for very large files',
+            action='store_true')
+        argparser.add_argument(
+            '-parse_workers',
+            '--parse_workers',
+            dest='parse_workers',
+            help='tokenize and parse the sections of each .yml file in this number of worker processes, e.g. for very large files; 0 parses them in a single pass (default: %(default)s)',
+            action='store',
+            default=0,
+            type=int)
         argparser.add_argument(
             '-indent',
             '--indent_size',
@@ -1963,62 +3911,40 @@ if __name__ == '__main__':
         # print('indent size = {}'.format(args.indent_size))
         # print('buffer size = {}'.format(args.buffer_size))
         filenames = args['pathname']
-
-        # Some argument is passed:
-        file_check = filenames[0]
-
-        if os.path.isdir(str(file_check)):
-            print(
-                'You have given a directory!\nUsage: $ python caes.py path_to_file | [path_to_file]+'
-            )
+        lod = None
+        if args['lod_depth'] is not None:
+            lod = {
+                'max_depth': args['lod_depth'],
+                'max_arguments': args['lod_size']
+            }
+        cache = None
+        if args['render_cache'] is not None:
+            cache = RenderCache(args['render_cache'],
+                                args['render_cache_size'] * 1024 * 1024)
+
+        filenames = expand_paths(filenames)
+        if not filenames:
+            print('No case file found in {}'.format(' '.join(args['pathname'])))
             exit()
-
-        elif len(filenames) > 1:  # if user gave a list of filenames
+        if len(filenames) > 1:
             # inform the number of files
             print('{} files detected'.format(len(filenames)))
 
-            for filename in filenames:
-                logger_file = '../../log/{}.log'.format(
-                    filename.split('/')[-1][:-4])
-                logging.basicConfig(
-                    format='%(message)s',
-                    level=args['logger'],
-                    filemode='w',
-                    filename=logger_file)
-
-                # check that the filename parsed are all files
-                assert os.path.isfile(filename), logging.exception(
-                    '{} is not a file'.format(filename))
-                print('\nProcessing {}'.format(filename))
-
-                Reader(
-                    buffer_size=args['buffer_size'],
-                    indent_size=args['indent_size']).load(
-                        filename, dialogue=args['dialogue'])
-
-                logger = logging.getLogger()
-                logger.removeHandler(logger.handlers[0])
+        if args['watch']:
+            watch(filenames, args, cache, lod, interval=args['watch_interval'])
+            exit()
 
-        else:
-            if os.path.isfile(file_check):
-                logger_file = '../../log/{}.log'.format(
-                    file_check.split('/')[-1][:-4])
-                logging.basicConfig(
-                    format='%(message)s',
-                    level=args['logger'],
-                    filemode='w',
-                    filename=logger_file)
-
-                # check that the filename parsed are all files
-                assert os.path.isfile(file_check), logging.exception(
-                    '{} is not a file'.format(filename))
-                print('\nProcessing {}'.format(file_check))
-
-                Reader(
-                    buffer_size=args['buffer_size'],
-                    indent_size=args['indent_size']).load(
-                        file_check, dialogue=args['dialogue'])
+        results = run_batch(filenames, args, cache, lod, jobs=args['jobs'])
+        print()
+        print(format_summary(results))
 
-            else:
-                logging.error('Cannot find file {}'.format(filenames))
-                exit()
+        if args['graphviz'] is not None:
+            # render the dot files of all the files with as few graphviz
+            # processes as possible
+            render_dot_files(
+                dot_files(filenames),
+                args['graphviz'],
+                workers=max(1, args['render_workers']))
+
+        if not all(result.ok for result in results):
+            exit(1)
@@ -51,3 +51,49 @@ class ReaderError(Error):
 
     def __init__(self, message):
         self.message = message
+
+
+# ------------------------------------------------
+#   Error for rendering
+# ------------------------------------------------
+class RenderError(Error):
+    """
+    Rendering throws error if graphviz cannot render the dot files
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+# ------------------------------------------------
+#   Error for Dialogue
+# ------------------------------------------------
+class DialogueError(Error):
+    """
+    Dialogue throws error if a checkpoint cannot be resumed
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+# ------------------------------------------------
+#   Error for the binary graph files
+# ------------------------------------------------
+class GraphFileError(Error):
+    """
+    A binary graph file throws error if it is not a graph file of a version
+    supported
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message
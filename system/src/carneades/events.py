@@ -0,0 +1,215 @@
+"""
+Structured event log for the dialogue mode.
+
+Each time the :class:`Dialogue` logs its current state, a :class:`TurnEvent`
+is emitted to a sink. A sink either keeps the events in memory
+(:class:`MemorySink`) or streams them to disk as newline delimited JSON
+(:class:`NDJSONSink`). The human-readable dialogue summary is rendered from the
+events afterwards using :func:`render_summary`.
+
+>>> sink = MemorySink()
+>>> sink.emit(TurnEvent(seq=0, turn=0, actor='PROPONENT', issue='i',
+...                     burden_status='?', acceptable=False, top_issue='i',
+...                     top_acceptable=None,
+...                     added=[{'arg_id': 'arg1', 'claimer': 'PROPONENT',
+...                             'conclusion': 'i', 'premises': ['b', 'a'],
+...                             'exceptions': [], 'weight': 0.5}],
+...                     states={'i': 'claimed'}))
+>>> print(render_summary(sink.events()))
+================== turn 0 ==================
+BURDEN OF PROOF @ PROPONENT
+ARGUMENTS:
+[a, b], ~[] => i
+-----------------------------------------
+Burden of proof met by PROPONENT : ?
+-----------------------------------------
+		ISSUE "i" acceptable? -> False
+============================================
+<BLANKLINE>
+"""
+import json, os
+from collections import namedtuple
+try:
+    from .error import DialogueError
+except ImportError:
+    from error import DialogueError
+
+TurnEvent = namedtuple('TurnEvent', [
+    'seq', 'turn', 'actor', 'issue', 'burden_status', 'acceptable',
+    'top_issue', 'top_acceptable', 'added', 'states'
+])
+"""
+A snapshot of the dialogue, emitted whenever the dialogue state is logged.
+
+:param seq: the sequence number of the event, starting from 0
+:param turn: the turn number of the dialogue
+:param actor: the party with the burden of proof - `PROPONENT` or `RESPONDENT`
+:param issue: the issue currently argued about
+:param burden_status: whether the burden of proof is met by the actor
+:param acceptable: acceptability of the issue in the current state
+:param top_issue: the issue that started the dialogue
+:param top_acceptable: acceptability of the top issue; ``None`` if the issue\
+is the top issue
+:param added: the arguments added since the previous event, each as a dict of\
+`arg_id`, `claimer`, `conclusion`, `premises`, `exceptions` and `weight`
+:param states: the propositions whose state changed since the previous event,\
+mapped to their new state
+"""
+
+
+class EventSink(object):
+    """
+    Base class for the sinks receiving the :class:`TurnEvent` of a dialogue
+    """
+
+    def emit(self, event):
+        raise NotImplementedError
+
+    def events(self):
+        """
+        Return an iterable over the events emitted so far
+        """
+        raise NotImplementedError
+
+    def sync(self):
+        """
+        Make sure the events emitted so far are kept, e.g. before a
+        checkpoint of the dialogue is written
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class MemorySink(EventSink):
+    """
+    Keep the events in a list
+    """
+
+    def __init__(self):
+        self._events = []
+
+    def emit(self, event):
+        self._events.append(event)
+
+    def events(self):
+        return iter(self._events)
+
+
+class NDJSONSink(EventSink):
+    """
+    Stream the events to :param: path, one JSON object per line
+    """
+
+    def __init__(self, path, buffer_size=4096, resume_at=0):
+        """
+        If :param: resume_at is given, the first `resume_at` events already in
+        the file are kept and the following ones are discarded. If the file
+        holds fewer events, e.g. as they were lost in a crash, a
+        :class:`DialogueError` is raised.
+
+        >>> import tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'turns.ndjson')
+        >>> with open(path, 'w') as f:
+        ...     _ = f.write('{}\\n{}\\n{"seq": 2')
+        >>> NDJSONSink(path, resume_at=3)  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+        ...
+        error.DialogueError: The event log ... holds 2 events, but the dialogue resumes at event 3
+        >>> NDJSONSink(path, resume_at=2).close()
+        >>> open(path).read()
+        '{}\\n{}\\n'
+        """
+        self.path = path
+        if resume_at:
+            offset = 0
+            with open(path, 'rb') as f:
+                for kept in range(resume_at):
+                    line = f.readline()
+                    if not line.endswith(b'\n'):  # missing or cut short
+                        raise DialogueError(
+                            'The event log {} holds {} events, but the '
+                            'dialogue resumes at event {}'.format(
+                                path, kept, resume_at))
+                    offset += len(line)
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+            self.stream = open(path, 'a', buffering=buffer_size)
+        else:
+            self.stream = open(path, 'w', buffering=buffer_size)
+
+    def emit(self, event):
+        self.stream.write(json.dumps(event._asdict()) + '\n')
+
+    def events(self):
+        self.stream.flush()
+        return read_events(self.path)
+
+    def sync(self):
+        self.stream.flush()
+        os.fsync(self.stream.fileno())
+
+    def close(self):
+        if not self.stream.closed:
+            self.stream.close()
+
+
+def read_events(path):
+    """
+    Read the events of a NDJSON event log lazily
+    """
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield TurnEvent(**json.loads(line))
+
+
+def argument_text(entry):
+    """
+    Format an argument in :attr:`TurnEvent.added` the same way as
+    ``Argument.__str__`` does.
+
+    >>> argument_text({'conclusion': '-c', 'premises': ['b', 'a'],
+    ...                'exceptions': ['e']})
+    '[a, b], ~[e] => -c'
+    """
+    prems = '[{}]'.format(', '.join(sorted(entry['premises'])))
+    excepts = '[{}]'.format(', '.join(sorted(entry['exceptions'])))
+    return '{}, ~{} => {}'.format(prems, excepts, entry['conclusion'])
+
+
+def render_summary(events):
+    """
+    Render the human-readable dialogue summary from a sequence of events
+    """
+    lines = []
+    arguments = []  # the arguments in the dialogue state so far
+    for event in events:
+        arguments.extend(argument_text(entry) for entry in event.added)
+        lines.append('================== turn {} =================='.format(
+            event.turn))
+        lines.append('BURDEN OF PROOF @ {}'.format(event.actor))
+        lines.append('ARGUMENTS:')
+        lines.extend(arguments)
+        lines.append('-----------------------------------------')
+        lines.append('Burden of proof met by {} : {}'.format(
+            event.actor, event.burden_status))
+        lines.append('-----------------------------------------')
+        lines.append('\t\tISSUE "{}" acceptable? -> {}'.format(
+            event.issue, event.acceptable))
+        if event.top_issue != event.issue:
+            lines.append('TOP ISSUE "{}" acceptable? -> {}'.format(
+                event.top_issue, event.top_acceptable))
+        lines.append('============================================')
+    lines.append('')
+    return '\n'.join(lines)
+
+
+# -----------------------------------------------------------------------
+# MAIN
+# -----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
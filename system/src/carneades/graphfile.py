@@ -0,0 +1,478 @@
+"""
+A binary file format for a built :class:`ArgumentSet`, which is evaluated
+directly from the file mapped in memory.
+
+:func:`write_graph` writes the arguments of an argument set to a file, and a
+:class:`MappedArgumentSet` maps the file in memory and answers the queries of
+:class:`CAES` from the arrays of the file: opening a file only reads its
+header, and an :class:`Argument` is only created when a query returns it. As
+the file is mapped read-only, the worker processes evaluating the same file
+share its pages in the page cache (a MappedArgumentSet is pickled as its
+path).
+
+Format
+------
+All the integers are unsigned and little-endian. The file starts with a
+header of 40 bytes::
+
+    magic         8 bytes   b'CAESARGS'
+    version       uint32    VERSION
+    n_strings     uint32    number of strings in the string table
+    n_args        uint32    number of arguments
+    n_slots       uint32    size of the hash table, a power of two
+    n_premises    uint32    total number of premises
+    n_exceptions  uint32    total number of exceptions
+    n_bytes       uint64    size of the UTF-8 text of the strings
+
+followed by these arrays, in this order, each starting at a multiple of 8
+bytes (see :data:`SECTIONS`)::
+
+    string_offsets     uint64 [n_strings + 1]   string i is the UTF-8 text
+                                                string_bytes[off[i]:off[i+1]]
+    string_hash        uint32 [n_slots]         1 + index of a string, or 0;
+                                                string s is looked up from
+                                                slot crc32(s) % n_slots on
+                                                (linear probing)
+    string_arg         uint32 [n_strings]       1 + index of the (last)
+                                                argument with the string as
+                                                id, or 0
+    literal_flags      uint8  [2 * n_strings]   1 if the literal is a
+                                                proposition of the graph
+    conclusion_offsets uint32 [2 * n_strings + 1]
+    conclusion_args    uint32 [n_args]          the arguments pro literal l
+                                                are conclusion_args[off[l]:
+                                                off[l+1]], in order
+    arg_id             uint32 [n_args]          1 + index of the id, or 0
+    arg_conclusion     uint32 [n_args]          literal
+    arg_weight         float64 [n_args]
+    premise_offsets    uint32 [n_args + 1]      the premises of argument a
+                                                are premises[off[a]:off[a+1]]
+    premises           uint32 [n_premises]      literals, sorted
+    exception_offsets  uint32 [n_args + 1]
+    exceptions         uint32 [n_exceptions]    literals, sorted
+    string_bytes       uint8  [n_bytes]
+
+A literal is the proposition of string s with a polarity: 2 * s for the
+positive literal and 2 * s + 1 for the negative one.
+
+>>> import os, tempfile
+>>> a, b, c = PropLiteral('a'), PropLiteral('b'), PropLiteral('c')
+>>> argset = ArgumentSet()
+>>> argset.add_argument(Argument(a, premises={b}, weight=0.6, arg_id='arg1'))
+>>> argset.add_argument(Argument(a.negate(), exceptions={c}, weight=0.4,
+...                              arg_id='arg2'))
+>>> path = os.path.join(tempfile.mkdtemp(), 'case.args')
+>>> write_graph(argset, path)
+>>> mapped = MappedArgumentSet(path)
+>>> mapped.arg_count
+2
+>>> [str(arg) for arg in mapped.get_arguments_con(a)]
+['[], ~[c] => -a']
+>>> mapped.weights['arg1']
+0.6
+>>> mapped.get_arguments(c.negate())
+Traceback (most recent call last):
+...
+ValueError: Proposition '-c' is not in the current graph
+
+The arguments are evaluated from the file:
+>>> from caes import Audience, CAES, ProofStandard
+>>> caes = CAES(mapped, Audience({b}, mapped.weights), ProofStandard([]))
+>>> caes.acceptable(a)
+True
+>>> mapped.close()
+>>> os.remove(path)
+"""
+import mmap, os, struct, sys, zlib
+from array import array
+from collections.abc import Mapping
+try:
+    from .caes import Argument, ArgumentSet, PropLiteral
+    from .error import GraphFileError
+except ImportError:
+    from caes import Argument, ArgumentSet, PropLiteral
+    from error import GraphFileError
+
+MAGIC = b'CAESARGS'
+VERSION = 1
+HEADER = struct.Struct('<8sIIIIIIQ')
+
+# the arrays of a file, in order: (name, typecode, length from the header)
+SECTIONS = (
+    ('string_offsets', 'Q', lambda h: h['n_strings'] + 1),
+    ('string_hash', 'I', lambda h: h['n_slots']),
+    ('string_arg', 'I', lambda h: h['n_strings']),
+    ('literal_flags', 'B', lambda h: 2 * h['n_strings']),
+    ('conclusion_offsets', 'I', lambda h: 2 * h['n_strings'] + 1),
+    ('conclusion_args', 'I', lambda h: h['n_args']),
+    ('arg_id', 'I', lambda h: h['n_args']),
+    ('arg_conclusion', 'I', lambda h: h['n_args']),
+    ('arg_weight', 'd', lambda h: h['n_args']),
+    ('premise_offsets', 'I', lambda h: h['n_args'] + 1),
+    ('premises', 'I', lambda h: h['n_premises']),
+    ('exception_offsets', 'I', lambda h: h['n_args'] + 1),
+    ('exceptions', 'I', lambda h: h['n_exceptions']),
+    ('string_bytes', 'B', lambda h: h['n_bytes']),
+)
+HEADER_FIELDS = ('magic', 'version', 'n_strings', 'n_args', 'n_slots',
+                 'n_premises', 'n_exceptions', 'n_bytes')
+
+
+def align(offset):
+    return (offset + 7) & ~7
+
+
+def layout(header):
+    """
+    The (name, typecode, offset, length) of each array of a file with the
+    given :param: header (a dict)
+    """
+    offset = HEADER.size
+    sections = []
+    for name, typecode, length in SECTIONS:
+        offset = align(offset)
+        length = length(header)
+        sections.append((name, typecode, offset, length))
+        offset += length * array(typecode).itemsize
+    return sections
+
+
+def write_graph(argset, path):
+    """
+    Write the arguments and propositions of :param: argset to the binary
+    graph file at :param: path (see the format above)
+    """
+    if hasattr(argset, 'to_argset'):
+        argset = argset.to_argset()
+
+    strings = dict()  # string -> index
+
+    def string(s):
+        index = strings.get(s)
+        if index is None:
+            index = strings[s] = len(strings)
+        return index
+
+    def literal(prop):
+        return 2 * string(prop._string) + (not prop.polarity)
+
+    props = [literal(prop) for prop in argset.prop_vertex]
+    arguments = argset.arguments
+    arg_id, arg_conclusion, premises, exceptions = [], [], [], []
+    premise_offsets, exception_offsets = [0], [0]
+    for argument in arguments:
+        arg_conclusion.append(literal(argument.conclusion))
+        premises.extend(literal(p) for p in sorted(argument.premises))
+        exceptions.extend(literal(e) for e in sorted(argument.exceptions))
+        premise_offsets.append(len(premises))
+        exception_offsets.append(len(exceptions))
+    for argument in arguments:
+        arg_id.append(0 if argument.arg_id is None else
+                      string(str(argument.arg_id)) + 1)
+
+    n_strings = len(strings)
+    encoded = [s.encode('utf-8') for s in strings]
+    string_offsets = [0]
+    for s in encoded:
+        string_offsets.append(string_offsets[-1] + len(s))
+
+    n_slots = 1
+    while n_slots < 2 * n_strings:
+        n_slots *= 2
+    string_hash = [0] * n_slots
+    for index, s in enumerate(encoded):
+        slot = zlib.crc32(s) & (n_slots - 1)
+        while string_hash[slot]:
+            slot = (slot + 1) & (n_slots - 1)
+        string_hash[slot] = index + 1
+
+    string_arg = [0] * n_strings
+    for index, s in enumerate(arg_id):
+        if s:
+            string_arg[s - 1] = index + 1
+
+    literal_flags = [0] * (2 * n_strings)
+    for l in props:
+        literal_flags[l] = 1
+
+    # the arguments pro each literal, as in the argument set: in the order
+    # the arguments were added
+    counts = [0] * (2 * n_strings + 1)
+    for l in arg_conclusion:
+        counts[l + 1] += 1
+    for l in range(2 * n_strings):
+        counts[l + 1] += counts[l]
+    conclusion_offsets = list(counts)
+    conclusion_args = [0] * len(arguments)
+    for index, l in enumerate(arg_conclusion):
+        conclusion_args[counts[l]] = index
+        counts[l] += 1
+
+    header = dict(
+        magic=MAGIC,
+        version=VERSION,
+        n_strings=n_strings,
+        n_args=len(arguments),
+        n_slots=n_slots,
+        n_premises=len(premises),
+        n_exceptions=len(exceptions),
+        n_bytes=string_offsets[-1])
+    values = dict(
+        string_offsets=string_offsets,
+        string_hash=string_hash,
+        string_arg=string_arg,
+        literal_flags=literal_flags,
+        conclusion_offsets=conclusion_offsets,
+        conclusion_args=conclusion_args,
+        arg_id=arg_id,
+        arg_conclusion=arg_conclusion,
+        arg_weight=[float(argument.weight) for argument in arguments],
+        premise_offsets=premise_offsets,
+        premises=premises,
+        exception_offsets=exception_offsets,
+        exceptions=exceptions)
+
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(*(header[field] for field in HEADER_FIELDS)))
+        for name, typecode, offset, length in layout(header):
+            f.write(b'\0' * (offset - f.tell()))
+            if name == 'string_bytes':
+                f.writelines(encoded)
+                continue
+            data = array(typecode, values[name])
+            if sys.byteorder != 'little':
+                data.byteswap()
+            data.tofile(f)
+    os.replace(tmp, path)
+
+
+class MappedArgumentSet(object):
+    """
+    The argument set of a binary graph file (see :func:`write_graph`),
+    mapped in memory. It answers the queries of :class:`CAES` like an
+    :class:`ArgumentSet`, and :meth:`to_argset` loads it in an ArgumentSet,
+    e.g. to be drawn.
+
+    :raises GraphFileError: if the file is not a graph file of this version
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise GraphFileError('{} is not a graph file'.format(
+                    self.path))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = dict(zip(HEADER_FIELDS, HEADER.unpack_from(self._mmap)))
+        if header['magic'] != MAGIC:
+            self.close()
+            raise GraphFileError('{} is not a graph file'.format(self.path))
+        if header['version'] != VERSION:
+            self.close()
+            raise GraphFileError(
+                '{} is a graph file of version {}, {} is expected'.format(
+                    self.path, header['version'], VERSION))
+        sections = layout(header)
+        name, typecode, offset, length = sections[-1]
+        if offset + length > size:
+            self.close()
+            raise GraphFileError('{} is truncated'.format(self.path))
+
+        self._views = []
+        view = memoryview(self._mmap)
+        self._views.append(view)
+        for name, typecode, offset, length in sections:
+            data = view[offset:offset + length * array(typecode).itemsize]
+            if sys.byteorder != 'little' and typecode != 'B':
+                # the arrays cannot be used in place
+                data = array(typecode, data.tobytes())
+                data.byteswap()
+            else:
+                data = data.cast(typecode)
+                self._views.append(data)
+            setattr(self, '_' + name, data)
+
+        self.arg_count = header['n_args']
+        self._n_slots = header['n_slots']
+        self._arguments = dict()  # index -> Argument, once created
+
+    def close(self):
+        """
+        Unmap the file; the arguments already returned can still be used
+        """
+        for view in getattr(self, '_views', []):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getstate__(self):
+        # the worker processes map the file on their own
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self._open()
+
+    # ------------------------------------------------------------------
+    #   Strings and literals
+    # ------------------------------------------------------------------
+    def _string(self, index):
+        offsets = self._string_offsets
+        return bytes(self._string_bytes[offsets[index]:offsets[index + 1]]
+                     ).decode('utf-8')
+
+    def _find(self, s):
+        """
+        The index of the string :param: s, or None
+        """
+        encoded = s.encode('utf-8')
+        offsets, text = self._string_offsets, self._string_bytes
+        mask = self._n_slots - 1
+        slot = zlib.crc32(encoded) & mask
+        while True:
+            index = self._string_hash[slot] - 1
+            if index < 0:
+                return None
+            if text[offsets[index]:offsets[index + 1]] == encoded:
+                return index
+            slot = (slot + 1) & mask
+
+    def _literal(self, proposition):
+        index = self._find(proposition._string)
+        if index is None:
+            return None
+        return 2 * index + (not proposition.polarity)
+
+    def _prop(self, literal):
+        return PropLiteral(self._string(literal >> 1),
+                           polarity=not literal & 1)
+
+    # ------------------------------------------------------------------
+    #   Arguments
+    # ------------------------------------------------------------------
+    def argument(self, index):
+        """
+        The :class:`Argument` at :param: index, created on first use
+        """
+        argument = self._arguments.get(index)
+        if argument is None:
+            p0, p1 = self._premise_offsets[index:index + 2]
+            e0, e1 = self._exception_offsets[index:index + 2]
+            arg_id = self._arg_id[index]
+            argument = self._arguments[index] = Argument(
+                self._prop(self._arg_conclusion[index]),
+                premises={self._prop(l) for l in self._premises[p0:p1]},
+                exceptions={self._prop(l) for l in self._exceptions[e0:e1]},
+                weight=self._arg_weight[index],
+                arg_id=self._string(arg_id - 1) if arg_id else None)
+        return argument
+
+    @property
+    def arguments(self):
+        """
+        All the arguments, in the order they were added
+        """
+        return [self.argument(i) for i in range(self.arg_count)]
+
+    @property
+    def weights(self):
+        """
+        The weight of each argument by its id, e.g. for an :class:`Audience`
+        """
+        return MappedWeights(self)
+
+    def propset(self):
+        return {
+            self._prop(l)
+            for l, flag in enumerate(self._literal_flags) if flag
+        }
+
+    def get_arguments(self, proposition):
+        """
+        Find the arguments for a proposition, as
+        :meth:`ArgumentSet.get_arguments`
+
+        :raises ValueError: if the proposition is not in the graph
+        """
+        l = self._literal(proposition)
+        if l is None or not self._literal_flags[l]:
+            raise ValueError("Proposition '{}' is not in the current graph".
+                             format(proposition))
+        start, end = self._conclusion_offsets[l:l + 2]
+        return [self.argument(i) for i in self._conclusion_args[start:end]]
+
+    def get_arguments_con(self, proposition):
+        return self.get_arguments(proposition.negate())
+
+    def to_argset(self):
+        """
+        Load the arguments in an :class:`ArgumentSet`
+        """
+        argset = ArgumentSet.build(self.arguments)
+        for prop in sorted(self.propset()):
+            argset.add_proposition(prop)  # not in any argument
+        return argset
+
+    def lod(self, *args, **kwargs):
+        return self.to_argset().lod(*args, **kwargs)
+
+    def draw(self,
+             g_filename,
+             debug=False,
+             cache=None,
+             layout_cache=None,
+             layout=None):
+        self.to_argset().draw(
+            g_filename,
+            debug=debug,
+            cache=cache,
+            layout_cache=layout_cache,
+            layout=layout)
+
+    def write_to_graphviz(self, fname=None, cache=None):
+        self.to_argset().write_to_graphviz(fname, cache=cache)
+
+
+class MappedWeights(Mapping):
+    """
+    The weights of the arguments of a :class:`MappedArgumentSet`, by
+    argument id; the weight of an id given to several arguments is that of
+    the last one
+    """
+
+    def __init__(self, argset):
+        self.argset = argset
+
+    def __getitem__(self, arg_id):
+        index = self.argset._find(str(arg_id))
+        if index is None or not self.argset._string_arg[index]:
+            raise KeyError(arg_id)
+        return self.argset._arg_weight[self.argset._string_arg[index] - 1]
+
+    def __iter__(self):
+        for index, arg in enumerate(self.argset._string_arg):
+            if arg:
+                yield self.argset._string(index)
+
+    def __len__(self):
+        return sum(1 for arg in self.argset._string_arg if arg)
+
+
+# -----------------------------------------------------------------------
+# MAIN
+# -----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
@@ -1,14 +1,34 @@
+import io, json, re
 from collections import deque
-from error import ParseError
+try:
+    from .error import ParseError, TokenizerError
+    from .tokenizer import Tokenizer
+except ImportError:
+    from error import ParseError, TokenizerError
+    from tokenizer import Tokenizer
+
+# the headers of the sections of a source file
+HEADERS = [
+    'PROPOSITION', 'ARGUMENT', 'ASSUMPTION', 'PARAMETER', 'ISSUE',
+    'PROOFSTANDARD'
+]
 
 # -------------------------------------------------------------------------
 # :class: parser
+# :class: SectionParser
+# :class: IncrementalParser
+# :class: DictParser
 # :class: Node
 # :def: generateStruct
-# :def: find_chunks_depth
-# :def: find_STMT
+# :def: indent_runs
+# :def: find_chunk_end
+# :def: parse_chunk
 # :def: find_SEQUENCE
-# :def: infer_depth
+# :def: find_STMT
+# :def: split_sections
+# :def: parse_section
+# :def: case_node
+# :def: read_json
 # -------------------------------------------------------------------------
 
 
@@ -57,6 +77,9 @@ class Parser(object):
         Create a parser for the stream of tokens.
         When initiailised, the parser will call self.parse() to parse the tokens into the components.
 
+        The :param:tokens can be any iterable of tokens, e.g. the generator
+        :meth:`Tokenizer.iter_tokens`: they are consumed in a single pass.
+
         If the headers are not found, or more than one of each type of label is found, an error will be raised.
 
         """
@@ -76,141 +99,462 @@ class Parser(object):
         - ASSUMPTION
         - ARGUMENT
         - PARAMETER
+
+        The tokens are read in one forward pass: the tokens of a header are
+        kept until the next header is found, and then turned into its
+        structure right away.
         """
-        found = set()  # set that contains the headers found
-        headers = [
-            'PROPOSITION', 'ARGUMENT', 'ASSUMPTION', 'PARAMETER', 'ISSUE',
-            'PROOFSTANDARD'
-        ]
-        previous_idx = len(self.tokens)  # starting from the back
-        for idx, tok in reversed(list(enumerate(self.tokens))):
+        sections = []  # (header, structure or error) in the order found
+        header, toks = None, []
+        for tok in self.tokens:
             # find tok_type = `STMT`, and check if it is one of the headers
-            if tok.tok_type == 'STMT' and tok.c in headers:
-                if tok.c not in found:
-                    # call generateStruct to create nodes for each headers
-                    if tok.c == 'PROPOSITION':
-                        toks = self.tokens[idx:previous_idx]
-                        self.proposition = self.generateStruct(toks)
-
-                    elif tok.c == 'ASSUMPTION':
-                        toks = self.tokens[idx:previous_idx]
-                        self.assumption = self.generateStruct(toks)
-
-                    elif tok.c == 'ARGUMENT':
-                        toks = self.tokens[idx:previous_idx]
-                        self.argument = self.generateStruct(toks)
-
-                    elif tok.c == 'PARAMETER':
-                        toks = self.tokens[idx:previous_idx]
-                        self.parameter = self.generateStruct(toks)
-
-                    elif tok.c == 'ISSUE':
-                        toks = self.tokens[idx:previous_idx]
-                        self.issue = self.generateStruct(toks)
-
-                    elif tok.c == 'PROOFSTANDARD':
-                        toks = self.tokens[idx:previous_idx]
-                        self.proofstandard = self.generateStruct(toks)
-
-                    previous_idx = idx  # update the index so that the next header's indices will not include those of the previous header
-                    found.add(tok.c)  # maintain a list of this that is found
-
-                elif tok.c in found:
-                    # prevent multiple usage of headers!
-                    raise ParseError(
-                        'More than one header of {} is found. Check that you only have one of each headers: {}'.
-                        format(tok.c, headers))
+            if tok.tok_type == 'STMT' and tok.c in HEADERS:
+                if header is not None:
+                    sections.append((header, self._section(toks)))
+                header, toks = tok.c, []
+            if header is not None:
+                toks.append(tok)
+        if header is not None:
+            sections.append((header, self._section(toks)))
+        self.assemble(sections)
+
+    def assemble(self, sections):
+        """
+        Check the (header, structure or error) :param: sections found, in
+        the order of the file, and keep the structure of each header
+        """
+        found = set()  # set that contains the headers found
+        headers = HEADERS
+        # the errors are raised as if the headers were checked from the last
+        # one to the first one
+        for header, struct in reversed(sections):
+            if header in found:
+                # prevent multiple usage of headers!
+                raise ParseError(
+                    'More than one header of {} is found. Check that you only have one of each headers: {}'.
+                    format(header, headers))
+            if isinstance(struct, Exception):
+                raise struct
+            setattr(self, header.lower(), struct)
+            found.add(header)  # maintain a list of this that is found
 
         if len(found) != len(headers):
             raise ParseError(
                 'Expected labels are: {}. However, only {} found.'.format(
                     headers, found))
 
+    def _section(self, toks):
+        # the structure of the tokens of a header, or the error raised while
+        # generating it, to be raised once all the headers are found
+        try:
+            return self.generateStruct(toks)
+        except Exception as e:
+            return e
+
     def generateStruct(self, toks):
         """
         generateStruct generates the structure of the tokens in the `toks` stream. The two strcuture supported are 1) in-line lists/sequence, 2) dictionarys/maps
 
-        if there is a MAPPING_VALUE, and hence a map exists, a dict() is called and then it calls on generateStruct for the rest of the token streams.
+        if there is a MAPPING_VALUE, and hence a map exists, a :class:`Node` is created for the key, and the structure of each of the indented keys below it is added as a child.
 
         if there is a SEQUENCE_OPEN, and hence a list/sequence exists, a list() is used to store the list/sequence elements. The SEQUENCE_CLOSE token indicates the end of the sequence. Each element is separated by the SEQUENCE_SEPARATOR token.
+
+        The tokens are walked once with a cursor (see :func:`parse_chunk`),
+        so that the time taken is linear in the number of tokens whatever
+        their nesting.
+        """
+        toks = list(toks)
+        return parse_chunk(toks, indent_runs(toks), 0, 0)[0]
+
+
+# ---------------------------------------------------------------------------
+
+
+class SectionParser(Parser):
+    """
+    Parse the lines of a file section by section: the lines are split into
+    sections at the lines starting with a header (see
+    :func:`split_sections`), and each section is tokenized and parsed on its
+    own (see :func:`parse_section`), in :param: workers worker processes if
+    more than 0. The structures of the sections are then checked together
+    as by :class:`Parser`, and so are the errors.
+
+    The lines and structure of each section are kept in :attr:`sections`.
+    If a header is not at the start of its line, or is found more than once,
+    the whole file is parsed as by :class:`Parser`.
+
+    >>> lines = ['PROPOSITION:\\n', '  p: a\\n', '  q: b\\n',
+    ...          'ASSUMPTION: [q]\\n', 'ARGUMENT:\\n', '  arg1:\\n',
+    ...          '    premise: [q]\\n', '    exception: []\\n',
+    ...          '    conclusion: p\\n', '    weight: 0.5\\n',
+    ...          'PARAMETER:\\n', '  alpha: 0.4\\n', 'PROOFSTANDARD: []\\n',
+    ...          'ISSUE: [p]\\n']
+    >>> p = SectionParser(lines, workers=2)
+    >>> p.argument.find_child('arg1').find_child('weight').children
+    [0.5]
+    >>> SectionParser(lines[:8] + ['    conclusion:\\n'] + lines[9:], workers=2)
+    Traceback (most recent call last):
+    ...
+    error.ParseError: Incomplete syntax found at line 9 col 15
+    """
+
+    def __init__(self, lines, indent_size=2, workers=0):
+        """
+        :param lines: the lines of the file, as a list
+        :param workers: the number of worker processes the sections are
+        parsed in, or 0 to parse them in this process
+        """
+        self.lines = lines
+        self.indent_size = indent_size
+        self.workers = workers
+        self.sections = dict()  # header -> (lines, structure)
+        self.changed = set(HEADERS)
+        Parser.__init__(self, None)
+
+    def parse(self):
+        split = split_sections(self.lines, self.indent_size)
+        if split is None:
+            self.tokens = Tokenizer(
+                self.lines, self.indent_size, lazy=True).iter_tokens()
+            Parser.parse(self)
+            return
+
+        changed = []
+        for header, start, end in split:
+            lines = self.lines[start:end]
+            kept = self.kept(header, lines)
+            if kept is not None:
+                self.sections[header] = kept
+            else:
+                changed.append((header, start, lines))
+
+        parsed = self.parse_sections(changed)
+        # the first error of the tokenizer is raised, as by a Parser
+        for error, struct in parsed:
+            if error is not None:
+                raise error
+        errors = dict()
+        for (header, start, lines), (error, struct) in zip(changed, parsed):
+            if isinstance(struct, Exception):
+                errors[header] = struct
+            else:
+                self.sections[header] = (lines, struct)
+        self.changed = {header for header, _, _ in changed if header}
+
+        self.assemble([(header, errors.get(header) or
+                        self.sections[header][1])
+                       for header, start, end in split if header])
+
+    def kept(self, header, lines):
+        """
+        The (lines, structure) of a section that does not have to be parsed
+        again, or None
+        """
+        return None
+
+    def parse_sections(self, sections):
+        """
+        :param sections: the (header, first line, lines) of the sections to
+        parse
+        :rtype: list - the result of :func:`parse_section` for each section
+        """
+        args = [(header, lines, self.indent_size, start + 1)
+                for header, start, lines in sections]
+        if self.workers <= 0 or len(sections) <= 1:
+            return [parse_section(*arg) for arg in args]
+
+        # the largest section is parsed here while the workers parse the
+        # others, so that its structure is not sent back from a worker
+        largest = max(range(len(args)), key=lambda i: len(args[i][1]))
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(min(self.workers,
+                                     len(args) - 1)) as executor:
+            futures = [
+                executor.submit(parse_section, *arg)
+                for i, arg in enumerate(args) if i != largest
+            ]
+            here = parse_section(*args[largest])
+            parsed = [future.result() for future in futures]
+            parsed.insert(largest, here)
+        return parsed
+
+
+class IncrementalParser(SectionParser):
+    """
+    Parse a new version of a file, only parsing again the header sections
+    that changed since a :param: previous parse of the file.
+
+    A section whose lines are the same as in the previous parse keeps its
+    structure, and only the other sections are tokenized and parsed (see
+    :class:`SectionParser`). The headers of the sections that changed are in
+    :attr:`changed`.
+
+    >>> v1 = ['PROPOSITION:\\n', '  p: a\\n', '  q: b\\n', 'ASSUMPTION: [q]\\n',
+    ...       'ARGUMENT:\\n', '  arg1:\\n', '    premise: [q]\\n',
+    ...       '    exception: []\\n', '    conclusion: p\\n',
+    ...       '    weight: 0.5\\n', 'PARAMETER:\\n', '  alpha: 0.4\\n',
+    ...       'PROOFSTANDARD: []\\n', 'ISSUE: [p]\\n']
+    >>> p1 = IncrementalParser(v1)
+    >>> sorted(p1.changed)
+    ['ARGUMENT', 'ASSUMPTION', 'ISSUE', 'PARAMETER', 'PROOFSTANDARD', 'PROPOSITION']
+    >>> v2 = list(v1); v2[9] = '    weight: 0.7\\n'
+    >>> p2 = IncrementalParser(v2, previous=p1)
+    >>> p2.changed
+    {'ARGUMENT'}
+    >>> p2.proposition is p1.proposition
+    True
+    >>> p2.argument.find_child('arg1').find_child('weight').children
+    [0.7]
+
+    The errors are those of a :class:`Parser`, at the lines of the file:
+    >>> v3 = list(v1); v3[8] = '    conclusion:\\n'
+    >>> IncrementalParser(v3, previous=p2)
+    Traceback (most recent call last):
+    ...
+    error.ParseError: Incomplete syntax found at line 9 col 15
+    """
+
+    def __init__(self, lines, indent_size=2, previous=None, workers=0):
         """
+        :param lines: the lines of the file, as a list
+        :param previous: the :class:`IncrementalParser` of the previous
+        version of the file, if any
+        """
+        self.previous = dict()
+        if previous is not None:
+            # do not keep all the versions alive
+            self.previous = previous.sections
+        SectionParser.__init__(self, lines, indent_size, workers)
+        self.previous = None
+
+    def kept(self, header, lines):
+        if header in self.previous and self.previous[header][0] == lines:
+            return self.previous[header]
+        return None
 
-        toks = deque(toks)  # use as a queue
-        root = None
 
-        t = toks.popleft()
-        t_type = t.tok_type
+class DictParser(Parser):
+    """
+    Take the structure of a case from a dict, e.g. loaded from JSON, instead
+    of parsing it from a source file: the headers are the keys of the
+    :param: case, and their content is turned into the structures a
+    :class:`Parser` gives for the same content (see :func:`case_node`). The
+    headers are checked as by :class:`Parser`.
+
+    >>> case = {'PROPOSITION': {'p': 'a', 'q': 'b'}, 'ASSUMPTION': ['q'],
+    ...         'ARGUMENT': {'arg1': {'premise': ['q'], 'exception': [],
+    ...                               'conclusion': 'p', 'weight': 0.5}},
+    ...         'PARAMETER': {'alpha': 0.4}, 'PROOFSTANDARD': [],
+    ...         'ISSUE': ['p']}
+    >>> p = DictParser(case)
+    >>> p.proposition.children, p.assumption.children
+    ([p, q], ['q'])
+    >>> p.argument.find_child('arg1').find_child('weight').children[0].data
+    '0.5'
+    >>> DictParser(dict(case, ISSUES=['p']))
+    Traceback (most recent call last):
+    ...
+    error.ParseError: ISSUES is not a header. The headers are: ['PROPOSITION', 'ARGUMENT', 'ASSUMPTION', 'PARAMETER', 'ISSUE', 'PROOFSTANDARD']
+    """
+
+    def __init__(self, case):
+        self.case = case
+        Parser.__init__(self, None)
+
+    def parse(self):
+        sections = []
+        for header, content in self.case.items():
+            if header not in HEADERS:
+                raise ParseError('{} is not a header. The headers are: {}'.
+                                 format(header, HEADERS))
+            if content is None:  # a header without content
+                content = []
+            sections.append((header, case_node(header, content)))
+        self.assemble(sections)
+
+
+def split_sections(lines, indent_size=2):
+    """
+    Split the :param: lines of a file into sections
+
+    :return: the (header, first line, end line) of each section, in order,
+    the lines before the first header being the section of None; or None if
+    the file cannot be split by lines
+
+    >>> split_sections(['# a case\\n', 'ISSUE: [p]\\n', 'PARAMETER:\\n'])
+    [(None, 0, 1), ('ISSUE', 1, 2), ('PARAMETER', 2, 3)]
+    >>> split_sections(['ISSUE: [p] ARGUMENT\\n']) is None
+    True
+    """
+    starts = []  # (line index, header)
+    for i, line in enumerate(lines):
+        if HEADER_WORD.search(line) is None:
+            continue
+        try:
+            toks = Tokenizer([line], indent_size).tokens
+        except TokenizerError:
+            return None
+        found = [
+            j for j, t in enumerate(toks)
+            if t.tok_type == 'STMT' and t.c in HEADERS
+        ]
+        if not found:
+            continue
+        if found != [0] or toks[0].c in (h for _, h in starts):
+            return None
+        starts.append((i, toks[0].c))
+    if not starts:
+        return None
 
-        # ------------------------------------------------------------------
-        #       A stream of tokens belonging to STMT will be followed
-        # ------------------------------------------------------------------
+    split = [(None, 0, starts[0][0])]
+    ends = [i for i, _ in starts[1:]] + [len(lines)]
+    for (start, header), end in zip(starts, ends):
+        split.append((header, start, end))
+    return split
 
-        if t_type == 'STMT':
-            # find any more part of the STMT
-            toks.appendleft(t)
-            toks, longsentence = find_STMT(toks)  # find the string
 
-            if len(toks) == 0:
-                # no more tokens left to processed (e.g end of a sentence)
-                return longsentence
+# a header can only be found in a line holding one of these words
+HEADER_WORD = re.compile('|'.join(HEADERS))
 
-            else:  # more tokens left to be processed:
-                t_next = toks.popleft()
 
-                # We will exepct a MAPPING_VALUE first:
-                if t_next.tok_type is 'MAPPING_VALUE':
-                    root = Node(longsentence)  # create the root node
+def parse_section(header, lines, indent_size=2, first_line=1):
+    """
+    Tokenize and parse the :param: lines of the section of :param: header,
+    the first of which is the line :param: first_line of the file. The lines
+    before the first header (the section of None) are only tokenized.
+
+    :rtype: tuple - the :class:`TokenizerError` raised, if any, and the
+    structure of the section or the error raised while generating it
+
+    >>> parse_section('ISSUE', ['ISSUE: [p, q]\\n'])
+    (None, ISSUE)
+    >>> parse_section('ISSUE', ['ISSUE: [p\\n'], first_line=3)[0]
+    TokenizerError(3, 9, '[ found but is not closed with ]')
+    """
+    try:
+        toks = Tokenizer(lines, indent_size, first_line=first_line).tokens
+    except TokenizerError as e:
+        return e, None
+    if header is None:
+        return None, None
+    try:
+        return None, parse_chunk(toks, indent_runs(toks), 0, 0)[0]
+    except Exception as e:
+        return None, e
+
+
+def case_node(key, value):
+    """
+    The :class:`Node` of :param: key holding :param: value, as parsed from
+    a source file: a dict is a map of nodes, a list is a sequence, and any
+    other value is a single word or number, kept as a string.
+
+    >>> node = case_node('arg1', {'premise': ['p', 'q'], 'weight': 1})
+    >>> node.children, node.find_child('weight').children[0].data
+    ([premise, weight], '1')
+    >>> case_node('arg1', {'conclusion': None})
+    Traceback (most recent call last):
+    ...
+    error.ParseError: No value found for conclusion
+    """
+    node = Node(str(key))
+    if isinstance(value, dict):
+        for child_key, child_value in value.items():
+            node.add_child(case_node(child_key, child_value))
+    elif isinstance(value, list):
+        node.add_child([case_word(key, element) for element in value])
+    else:
+        node.add_child(case_word(key, value))
+    return node
+
+
+def case_word(key, value):
+    # a value of :param: key that a source file can hold, as parsed
+    if value is None:
+        raise ParseError('No value found for {}'.format(key))
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ParseError('{} found for {}, but only words and numbers can '
+                         'be given'.format(value, key))
+    return str(value)
+
+
+def read_json(path, data=None):
+    """
+    Read the dict of a case from the JSON file at :param: path, see
+    :class:`DictParser`, or from its content :param: data if it is already
+    read.
+
+    If the file ends with `.ndjson`, each of its lines is a JSON object with
+    some of the headers, e.g. one proposition or argument per line. The
+    content of the headers found on several lines is put together, in the
+    order of the lines.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'case.ndjson')
+    >>> with open(path, 'w') as f:
+    ...     _ = f.write('{"PROPOSITION": {"p": "a"}, "ISSUE": ["p"]}\\n'
+    ...                 '\\n'
+    ...                 '{"PROPOSITION": {"q": "b"}, "ISSUE": ["q"]}\\n')
+    >>> read_json(path)
+    {'PROPOSITION': {'p': 'a', 'q': 'b'}, 'ISSUE': ['p', 'q']}
+    >>> with open(path, 'a') as f:
+    ...     _ = f.write('{"PROPOSITION": {"q": "c"}}\\n')
+    >>> read_json(path)
+    Traceback (most recent call last):
+    ...
+    error.ParseError: q is found more than once in PROPOSITION at line 4
+    >>> os.remove(path)
+    >>> read_json('case.json', b'["PROPOSITION"]')
+    Traceback (most recent call last):
+    ...
+    error.ParseError: A JSON object is expected in case.json
+    """
+    if data is None:
+        f = open(path, 'r')
+    else:
+        f = io.TextIOWrapper(io.BytesIO(data))
+    with f:
+        if not path.endswith('.ndjson'):
+            try:
+                case = json.load(f)
+            except ValueError as e:
+                raise ParseError('Invalid JSON in {}: {}'.format(path, e))
+            if not isinstance(case, dict):
+                raise ParseError(
+                    'A JSON object is expected in {}'.format(path))
+            return case
+
+        case = dict()
+        for lineIdx, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ParseError('Invalid JSON at line {}: {}'.format(
+                    lineIdx, e))
+            if not isinstance(record, dict):
+                raise ParseError(
+                    'A JSON object is expected at line {}'.format(lineIdx))
+            for header, content in record.items():
+                if header not in case:
+                    case[header] = content
+                elif isinstance(case[header], list) and \
+                        isinstance(content, list):
+                    case[header].extend(content)
+                elif isinstance(case[header], dict) and \
+                        isinstance(content, dict):
+                    for key in content:
+                        if key in case[header]:
+                            raise ParseError(
+                                '{} is found more than once in {} at line {}'.
+                                format(key, header, lineIdx))
+                    case[header].update(content)
                 else:
                     raise ParseError(
-                        'MAPPING_VALUE (:) is expected at line {} col {} `{}`. Instead, {} is found!'.
-                        format(t_next.lineIdx, t_next.colIdx, t.c, t_next.c))
-
-                # ----------------------------------------------------------
-                #       And find the children of the root:
-                #       - a map of stuffs
-                #       or ends with:
-                #           - a children is either a list/sequence
-                #           - or a sentence
-                # ----------------------------------------------------------
-                try:
-                    t_next = toks.popleft()
-                except IndexError:
-                    raise ParseError(
-                        "Incomplete syntax found at line {} col {}".format(
-                            t_next.lineIdx, t_next.colIdx))
-
-                if t_next.tok_type == 'SEQUENCE_OPEN':
-                    # a sequence list is given
-                    toks.appendleft(t_next)
-                    toks, the_List = find_SEQUENCE(toks)
-                    root.add_child(the_List)  # node will create a child node
-                    return root
-
-                elif t_next.tok_type == 'STMT':
-                    toks.appendleft(t_next)
-                    toks, the_List = find_STMT(toks)
-                    root.add_child(the_List)  # node will create a child node
-                    return root
-
-                # ----------------------------------------------------------
-                #   When an indent is found, it suggests that there are sub items
-                #   in belonging to this node. using `find_args_depth`, we retrieve
-                #   a list of nodes belonging to this level.
-                #   Each nodes will end up as the children of the root node.
-                #
-                #   find_args_depth iterateively calls `generateStruct`
-                #   to create these nodes
-                # ----------------------------------------------------------
-                #
-                elif t_next.tok_type == 'INDENT':  # is an INDENT, add the value to the master node
-                    toks.appendleft(t_next)
-                    depth = infer_depth(toks)
-                    # call find_args_depth to get the tokens that belongs to the
-                    # this key
-                    chunks = find_chunks_depth(toks, depth)
-                    for chunk in chunks:
-                        root.add_child(self.generateStruct(chunk))
-        return root
+                        'The content of {} at line {} does not add up with '
+                        'the lines before'.format(header, lineIdx))
+        return case
 
 
 # ---------------------------------------------------------------------------
@@ -218,7 +562,7 @@ class Parser(object):
 
 class Node(object):
     """
-    Nodes have children and contain data about itself, it uses `list()` to hold the multiple children
+    Nodes have children and contain data about itself, it uses `list()` to hold the multiple children, and a `dict()` to find a child node by its data
 
     >>> root = Node('ARGUMENT')
     >>> root.add_child(['one','two','three'])
@@ -241,16 +585,29 @@ class Node(object):
     ...     root.find_child('hamma')
     ... except ParseError:
     ...     pass
+
+    Only the children themselves are found, search deeper with
+    :meth:`find_descendant`:
+    >>> try:
+    ...     root.find_child(0.2)
+    ... except ParseError as e:
+    ...     print(e)
+    0.2 not found in PARAMETER
+    >>> root.find_descendant(0.2)
+    0.2
     """
+    __slots__ = ('data', 'children', 'keyed')
 
     def __init__(self, data):
         self.data = data
         self.children = []
+        self.keyed = dict()  # data -> child node, in the order added
 
     def add_child(self, child_data):
         # create node for child: using child as data
         if type(child_data) is Node:
             self.children.append(child_data)
+            self.keyed[child_data.data] = child_data
         else:
             if type(
                     child_data
@@ -260,28 +617,54 @@ class Node(object):
                 # otherwise if is just a word/statement, add it to the list
                 child_node = Node(child_data)
                 self.children.append(child_node)
+                self.keyed[child_data] = child_node
 
     def find_child(self, value):
         """
-        Given the data of the child, iteratively search the Node's children. Once found, return that node.
+        Given the data of a child, return that child node. If several
+        children have the same data, the last one is returned.
+
+        """
+        try:
+            return self.keyed[value]
+        except (KeyError, TypeError):  # TypeError: unhashable value
+            # throw error if not found
+            raise ParseError('{} not found in {}'.format(value, self))
+
+    def find_descendant(self, value):
+        """
+        Given the data of a node, search the Node's children, then their
+        children and so on (breadth first). Once found, return that node.
 
         """
         # add the list of children (nodes) into the queue
         queue = deque(self.children)
 
         while len(queue) > 0:
-            this_node = queue.pop()
+            this_node = queue.popleft()
+            if type(this_node) is not Node:
+                continue  # an element of a sequence
 
             if this_node.data == value:
                 return this_node
 
-            for child_node in this_node.children:  # breath first search
-                # if child_node not in visited:
-                queue.appendleft(child_node)
+            queue.extend(this_node.children)  # breath first search
 
         # throw error if not found
         raise ParseError('{} not found in {}'.format(value, self))
 
+    def __getstate__(self):
+        # the dict of the children is made again from the children when
+        # unpickled, e.g. from a worker process (see :class:`SectionParser`)
+        return self.data, self.children
+
+    def __setstate__(self, state):
+        self.data, self.children = state
+        self.keyed = {
+            child.data: child
+            for child in self.children if type(child) is Node
+        }
+
     def __str__(self):
         return str(self.data)
 
@@ -298,235 +681,244 @@ class Node(object):
 # ---------------------------------------------------------------------------
 #       Helper functions
 # ---------------------------------------------------------------------------
-def find_chunks_depth(toks, expected_depth):
-    """
-    Given a certain :param: depth and a stream of :param: toks, find_chunks_depth returns a list of :class: Node at :param: depth
-
-    Mechanism:
-    take the expected_depth (e.g.1):
-    if the toks have an INDENT token (hence depth of 1), then that is the 'root' node. everything with the more than the expected_depth is the children of the node.
-
-    So, while parsing the toks, if another token have only one INDENT (or of similar expected_depth), it must be another chunk (another root node)
-
-    >>> from tokenizer import Token; from collections import deque
-    >>> ind = Token('  ', 1,0, 'INDENT')
-    >>> stmt = Token('asd', 1,0, 'STMT')
-    >>> toks = [ind, stmt, ind, ind, stmt]; toks = deque(toks)
-    >>> find_chunks_depth(toks, 1)
-    [deque([STMT, INDENT, STMT])]
-
-    >>> toks = [ind, stmt, ind, ind, stmt, ind, ind, stmt]; toks = deque(toks)
-    >>> find_chunks_depth(toks, 1)
-    [deque([STMT, INDENT, STMT, INDENT, STMT])]
-
-    # two blocks
-    >>> toks = [ind, stmt, ind, ind, stmt, ind, ind, stmt, ind, stmt, ind, ind, stmt]; toks = deque(toks)
-    >>> find_chunks_depth(toks, 1)
-    [deque([STMT, INDENT, STMT, INDENT, STMT]), deque([STMT, INDENT, STMT])]
-
-    # if a depth lower than the expected_depth is found, stop and return
-    >>> deep_blocks = [ind, ind, stmt, ind, ind, stmt, ind, stmt]; toks=deque(deep_blocks)
-    >>> find_chunks_depth(toks, 2)
-    [deque([STMT]), deque([STMT])]
-    """
-    chunks = []
-    handling = False
-
-    while len(toks):
-
-        if handling:  # found a block, and extracting its elemnts
-            if toks[0].tok_type == 'INDENT':
-
-                # find the depth of the nearest line
-                this_depth = infer_depth(toks)
-
-                if this_depth > expected_depth:  # sub blocks
-                    num = expected_depth
-                    while num:  # pop only the expected number of indents
-                        toks.popleft()
-                        num -= 1
+#
+# The tokens of a header are walked once with an integer cursor. A chunk is
+# the tokens of a key, from its first line up to the next line that is not
+# indented more deeply than the key; `depth` is the number of INDENT tokens
+# of the key's line. The INDENT tokens come in runs, one run for the leading
+# indents of each line (or of consecutive lines holding only indents); the
+# first `depth` INDENT tokens of a run are not part of the chunk.
 
-                    delta = this_depth - expected_depth
-                    while delta:  # add the remaining indents into the chunk
-                        chunk.append(toks.popleft())
-                        delta -= 1  # remaining of indents left to add
 
-                if this_depth < expected_depth:
-                    break
-
-                if this_depth == expected_depth:
-                    chunks.append(chunk)
-                    handling = False  # found another block!
-                    continue
-
-            else:  # other token types
-                chunk.append(toks.popleft())  # add them to the chunk
+def indent_runs(toks):
+    """
+    The length of each run of INDENT tokens in :param: toks, by the index of
+    its first token
+
+    >>> from tokenizer import Token
+    >>> ind = Token('  ', 1, 0, 'INDENT')
+    >>> stmt = Token('asd', 1, 0, 'STMT')
+    >>> indent_runs([stmt, ind, ind, stmt, ind, stmt])
+    {1: 2, 4: 1}
+    """
+    runs = dict()
+    start = None
+    for i, t in enumerate(toks):
+        if t.tok_type == 'INDENT':
+            if start is None:
+                start = i
+                runs[start] = 0
+            runs[start] += 1
+        else:
+            start = None
+    return runs
 
-        else:  # not handling any blocks - the start state of this function
-            if toks[0].tok_type == 'INDENT':
 
-                this_depth = infer_depth(toks)
+def find_chunk_end(toks, runs, i, depth):
+    """
+    Move the cursor :param: i to the end of the chunk at :param: depth: the
+    first run of at most :param: depth INDENT tokens, or the end of
+    :param: toks
+
+    >>> from tokenizer import Token
+    >>> ind = Token('  ', 1, 0, 'INDENT')
+    >>> stmt = Token('asd', 1, 0, 'STMT')
+    >>> toks = [stmt, ind, ind, stmt, ind, stmt]
+    >>> find_chunk_end(toks, indent_runs(toks), 0, 1)
+    4
+    """
+    n = len(toks)
+    while i < n:
+        if toks[i].tok_type == 'INDENT':
+            if runs[i] <= depth:
+                break
+            i += runs[i]
+        else:
+            i += 1
+    return i
 
-                if this_depth == expected_depth:
-                    # if handling is true, then this will indicate a new block
-                    handling = True
-                    chunk = deque([])
 
-                    while this_depth:
-                        toks.popleft()  # remove all the INDENT tokens
-                        this_depth -= 1
+def at_chunk_end(toks, runs, i, depth):
+    return i >= len(toks) or (toks[i].tok_type == 'INDENT' and
+                               runs[i] <= depth)
 
-    chunks.append(chunk)
-    return chunks
 
+def parse_chunk(toks, runs, i, depth):
+    """
+    Generate the structure of the chunk starting at the cursor :param: i,
+    whose key is at :param: depth (see :meth:`Parser.generateStruct`)
 
-def find_SEQUENCE(toks):
+    :return: the structure and the cursor at the end of the chunk
+    """
+    if i >= len(toks):
+        # the chunk is only an indent
+        raise ParseError('Nothing found after the indent at line {} col {}'.
+                         format(toks[i - 1].lineIdx, toks[i - 1].colIdx))
+    t = toks[i]
+
+    # ------------------------------------------------------------------
+    #       A stream of tokens belonging to STMT will be followed
+    # ------------------------------------------------------------------
+    if t.tok_type != 'STMT':
+        return None, find_chunk_end(toks, runs, i, depth)
+
+    i, longsentence = find_STMT(toks, i)  # find the string
+    if at_chunk_end(toks, runs, i, depth):
+        # no more tokens left to processed (e.g end of a sentence)
+        return longsentence, i
+
+    t_next = toks[i]
+    if t_next.tok_type == 'INDENT':
+        # the first INDENT tokens of the run are not part of the chunk
+        t_next = toks[i + depth]
+    # We will exepct a MAPPING_VALUE first:
+    if t_next.tok_type != 'MAPPING_VALUE':
+        raise ParseError(
+            'MAPPING_VALUE (:) is expected at line {} col {} `{}`. Instead, {} is found!'.
+            format(t_next.lineIdx, t_next.colIdx, t.c, t_next.c))
+    root = Node(longsentence)  # create the root node
+    i += 1
+
+    # ----------------------------------------------------------
+    #       And find the children of the root:
+    #       - a map of stuffs
+    #       or ends with:
+    #           - a children is either a list/sequence
+    #           - or a sentence
+    #       anything else in the chunk is ignored
+    # ----------------------------------------------------------
+    if at_chunk_end(toks, runs, i, depth):
+        raise ParseError("Incomplete syntax found at line {} col {}".format(
+            t_next.lineIdx, t_next.colIdx))
+    t_type = toks[i].tok_type
+
+    if t_type == 'SEQUENCE_OPEN':
+        # a sequence list is given
+        i, the_List = find_SEQUENCE(toks, runs, i, depth)
+        root.add_child(the_List)  # node will create a child node
+
+    elif t_type == 'STMT':
+        i, the_List = find_STMT(toks, i)
+        root.add_child(the_List)  # node will create a child node
+
+    # ----------------------------------------------------------
+    #   When an indent is found, there are sub items belonging to this
+    #   node, all indented as deep as the first one. Each of them is the
+    #   chunk of a child of the root, and ends where the next one starts;
+    #   a line indented less deeply than them ends the children.
+    # ----------------------------------------------------------
+    elif t_type == 'INDENT':
+        child_depth = runs[i]
+        while i < len(toks) and runs.get(i) == child_depth:
+            child, i = parse_chunk(toks, runs, i + child_depth, child_depth)
+            root.add_child(child)
+
+    return root, find_chunk_end(toks, runs, i, depth)
+
+
+def find_SEQUENCE(toks, runs, i, depth):
     """
-    When a SEQUENCE_OPEN is found in the stream of toks, find_SEQUENCE creates a list and add those STMT into the list.
+    When a SEQUENCE_OPEN is found at the cursor :param: i, find_SEQUENCE
+    creates a list and add those STMT into the list.
+
+    If a SEQUENCE_CLOSE is not found before the end of the chunk at
+    :param: depth, an error is raised.
 
-    If a SEQUENCE_CLOSE is not found when no toks are left, an error is raised.
+    :return: the cursor after the SEQUENCE_CLOSE and the list
 
     DOCTEST for find_SEQUENCE:
     ---
-    >>> from tokenizer import Token; from collections import deque
+    >>> from tokenizer import Token
     >>> S_OPEN = Token('[', 0,0, 'SEQUENCE_OPEN' )
     >>> S_CLOSE = Token(']', 0,1, 'SEQUENCE_CLOSE')
     >>> S_SEP = Token('|', 0,1, 'SEQUENCE_SEPARATOR')
     >>> STMT = Token('item', 0,1, 'STMT')
     >>> MAPPING_VALUE = Token(':', 0,1, 'MAPPING_VALUE')
+    >>> def sequence(toks): return find_SEQUENCE(toks, {}, 0, 0)
 
-    >>> empty = deque([S_OPEN, S_CLOSE])
-    >>> toks, the_list = find_SEQUENCE(empty)
-    >>> toks
-    deque([])
-    >>> the_list
-    []
+    >>> sequence([S_OPEN, S_CLOSE])
+    (2, [])
 
     Error: No element in it but SEQUENCE_SEPARATOR found
-    >>> bad = deque([S_OPEN, S_SEP, S_CLOSE ])
-    >>> try: find_SEQUENCE(bad)
+    >>> try: sequence([S_OPEN, S_SEP, S_CLOSE])
     ... except ParseError: pass
 
     Good: two element
-    >>> ok = deque([S_OPEN, STMT, S_SEP, STMT, S_CLOSE])
-    >>> toks, the_list = find_SEQUENCE(ok)
-    >>> toks
-    deque([])
-    >>> the_list
-    ['item', 'item']
+    >>> sequence([S_OPEN, STMT, S_SEP, STMT, S_CLOSE])
+    (5, ['item', 'item'])
 
     Bad: mapping unit found
-    >>> bad = deque([S_OPEN, STMT, MAPPING_VALUE, STMT, S_CLOSE])
     >>> try:
-    ...     find_SEQUENCE(bad)
+    ...     sequence([S_OPEN, STMT, MAPPING_VALUE, STMT, S_CLOSE])
     ... except ParseError:
     ...     print('bad error')
     bad error
     """
-
     the_List = []
-    t = toks.popleft()
-    if t.tok_type == 'SEQUENCE_OPEN':
-        found = 0
-        num = 0  # count the number of sequence found
-
-        while len(toks) and not found:  # if the token stream is not dry
-
-            t = toks.popleft()
-
-            if t.tok_type == 'SEQUENCE_CLOSE':
-                # print('Number of item in list = {}'.format(str(num))) # DEBUG
-                found = 1
-
-                # check the number of elements in the list corresponds to the
-                # number of SEQUENCE_SEPARATOR found:
-                if num == 0:
-                    if len(the_List) > 1:
-                        raise ParseError(
-                            '{} SEQUENCE_SEPARATOR is found but none is expected'.
-                            format(str(num)))
-                    else:
-                        return toks, the_List  # empty list!
-                else:  # a separator found
-                    expectation = len(the_List) - 1
-                    if expectation != num:
-                        raise ParseError(
-                            '{} SEQUENCE_SEPARATOR is found but none is expected'.
-                            format(num))
-                    else:
-                        return toks, the_List  # empty list!
-
-            elif t.tok_type == 'SEQUENCE_OPEN':
+    t = toks[i]  # the last token read
+    i += 1
+    num = 0  # count the number of sequence found
+
+    while not at_chunk_end(toks, runs, i, depth):
+        t = toks[i]
+
+        if t.tok_type == 'SEQUENCE_CLOSE':
+            # check the number of elements in the list corresponds to the
+            # number of SEQUENCE_SEPARATOR found:
+            if num == 0:
+                if len(the_List) > 1:
+                    raise ParseError(
+                        '{} SEQUENCE_SEPARATOR is found but none is expected'.
+                        format(str(num)))
+            elif len(the_List) - 1 != num:
                 raise ParseError(
-                    '[ found at line {} col {} before closing. Nesting of list is not allowed'.
-                    format(t.lineIdx, t.colIdx))
+                    '{} SEQUENCE_SEPARATOR is found but none is expected'.
+                    format(num))
+            return i + 1, the_List
 
-            elif t.tok_type == 'MAPPING_VALUE':
-                raise ParseError(': found at line {} col {} before closing.'.
-                                 format(t.lineIdx, t.colIdx))
+        elif t.tok_type == 'SEQUENCE_OPEN':
+            raise ParseError(
+                '[ found at line {} col {} before closing. Nesting of list is not allowed'.
+                format(t.lineIdx, t.colIdx))
 
-            elif t.tok_type == 'STMT':
-                toks.appendleft(t)
-                toks, statement = find_STMT(toks)
-                the_List.append(statement)
+        elif t.tok_type == 'MAPPING_VALUE':
+            raise ParseError(': found at line {} col {} before closing.'.
+                             format(t.lineIdx, t.colIdx))
 
-            elif t.tok_type == 'SEQUENCE_SEPARATOR':
-                num += 1
+        elif t.tok_type == 'STMT':
+            i, statement = find_STMT(toks, i)
+            the_List.append(statement)
 
-        raise ParseError('Unable to parse the stream at line {}'.format(
-            t.lineIdx))
+        elif t.tok_type == 'SEQUENCE_SEPARATOR':
+            num += 1
+            i += 1
 
+        else:  # the indents are skipped
+            i += runs[i]
+            t = toks[i - 1]
 
-def infer_depth(toks):
-    """
-    Given the remaining toks, infer the depth of this sentence
-    depth = number of INDENT token(s) found in the stream of tokens until a MAPPING_VALUE or STMT is seen.
-    One is added because of the one that has already been pop-ed
-
-    DOCTESET to see if an error is thrown if the string is just all indent!
-    >>> from tokenizer import Token; from collections import deque;
-    >>> indent = Token('  ', 1,0, 'INDENT')
-    >>> toks = deque([indent, indent, indent])
-    >>> infer_depth(toks)
-    3
-    """
-    depth = 0
-    i = 0
-    while len(toks):
-        try:
-            t = toks[i]
-        except IndexError:
-            break
+    raise ParseError('Unable to parse the stream at line {}'.format(
+        t.lineIdx))
 
-        if t.tok_type == 'INDENT':
-            depth += 1
-            i += 1
-        else:
-            break
 
-    return depth
+def find_STMT(toks, i):
+    """
+    Find the STMT tokens from the cursor :param: i until a token of another
+    type (ie. "INDENT" or "MAPPING_VALUE"), and concatenate them to form a
+    longsentence.
 
+    :return: the cursor after the sentence and the longsentence
 
-def find_STMT(toks):
-    """
-    Given a partial sentence, and toks, find the rest of STMT in the toks queue by iteratively calling popleft() and checking if the tok_type is STMT.
-    If it is not (ie. the next tok in toks is "INDENT" or "MAPPING_VALUE"), then concatenate the sentence to form a longsentence and return it
+    >>> from tokenizer import Token
+    >>> toks = [Token(c, 1, 0, 'STMT') for c in ('not', 'guilty')]
+    >>> find_STMT(toks + [Token(':', 1, 0, 'MAPPING_VALUE')], 0)
+    (2, 'not guilty')
     """
-    sentence = []
-    while len(toks):
-        t = toks.popleft()
-
-        if t.tok_type == 'STMT':
-            sentence.append(t)
-        else:  # something that is not STMT, stop and return
-            toks.appendleft(t)
-            break
-
-    get_c = lambda s: s.c  # lambda function to iteratively get the tyoe
-    longsentence = [get_c(s) for s in sentence]
+    start = i
+    while i < len(toks) and toks[i].tok_type == 'STMT':
+        i += 1
     # append white space between tokens to form a string.
-    longsentence = ' '.join(longsentence)
-    return toks, longsentence
+    return i, ' '.join(t.c for t in toks[start:i])
 
 
 # ---------------------------------------------------------------------------
@@ -0,0 +1,428 @@
+"""
+Background rendering of the argumentation graphs.
+
+Drawing a graph (layout and plot) and writing it to graphviz takes far longer
+than evaluating it. A :class:`Renderer` takes the rendering requests off the
+evaluation: each request is queued to a pool of worker threads or processes,
+and :meth:`Renderer.flush` waits until all of them are done.
+
+The argset submitted must not change afterwards, as it is rendered later on;
+pass a snapshot of an argset that keeps changing.
+
+>>> class Fake(object):
+...     def __init__(self): self.drawn = []
+...     def draw(self, g_filename, cache, layout_cache, layout):
+...         self.drawn.append(g_filename)
+...     def write_to_graphviz(self, fname, cache): self.drawn.append(fname)
+>>> argset = Fake()
+>>> renderer = Renderer(workers=2)
+>>> renderer.submit(argset, 'full.pdf', 'full.dot')
+>>> renderer.flush()
+>>> argset.drawn
+['full.pdf', 'full.dot']
+
+With a :class:`LayoutCache`, the vertices are placed when the argset is
+submitted, and the workers are given their position:
+
+>>> class Placed(Fake):
+...     def layout(self, layout_cache): return [[0.0, 0.0]]
+...     def draw(self, g_filename, cache, layout_cache, layout):
+...         self.drawn.append(layout)
+>>> argset = Placed()
+>>> renderer.submit(argset, 'full.pdf', layout_cache=LayoutCache())
+>>> renderer.flush()
+>>> argset.drawn
+[[[0.0, 0.0]]]
+"""
+import logging, os, shutil, tempfile
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+try:
+    from .error import RenderError
+except ImportError:
+    from error import RenderError
+
+DOT_FORMATS = ('pdf', 'svg', 'png')
+
+
+def render(argset,
+           g_filename=None,
+           dot_filename=None,
+           cache=None,
+           layout_cache=None,
+           lod=None,
+           layout=None):
+    """
+    Draw :param: argset to :param: g_filename and write it to graphviz in
+    :param: dot_filename; a filename that is None is skipped
+
+    :param lod: if given, the keyword arguments of ``argset.lod`` to render
+    a level of detail of the argset instead
+    :param layout: if given, the position of the vertices drawn, see
+    ``ArgumentSet.layout``
+    """
+    if lod is not None:
+        argset = argset.lod(**lod)
+    if g_filename is not None:
+        argset.draw(g_filename,
+                    cache=cache,
+                    layout_cache=layout_cache,
+                    layout=layout)
+    if dot_filename is not None:
+        argset.write_to_graphviz(dot_filename, cache=cache)
+
+
+class RenderCache(object):
+    """
+    A directory of rendered graphs, named after the fingerprint of the
+    argset they were rendered from (see ``ArgumentSet.fingerprint``).
+
+    A cached graph is hard linked to the requested filename, or copied if
+    the link fails (e.g. across file systems); graphs are copied into the
+    cache. When the cache grows over :param: max_bytes, the graphs least
+    recently used are removed.
+
+    >>> tmp = tempfile.mkdtemp()
+    >>> cache = RenderCache(os.path.join(tmp, 'cache'), max_bytes=15)
+    >>> target = os.path.join(tmp, 'full.dot')
+    >>> cache.fetch('abc', target)
+    False
+    >>> with open(target, 'w') as f: _ = f.write('digraph G{}')
+    >>> cache.store('abc', target)
+    >>> os.remove(target)
+    >>> cache.fetch('abc', target)
+    True
+    >>> open(target).read()
+    'digraph G{}'
+    >>> with open(target + '2', 'w') as f: _ = f.write('digraph H{}')
+    >>> cache.store('def', target + '2')
+    >>> cache.fetch('abc', target)  # evicted: the cache is over 15 bytes
+    False
+
+    Threads may store the same key at once; the cache then holds one of the
+    graphs whole:
+
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> cache = RenderCache(os.path.join(tmp, 'shared'))
+    >>> graphs = []
+    >>> for i in range(8):
+    ...     graphs.append(os.path.join(tmp, 'g{}.dot'.format(i)))
+    ...     with open(graphs[-1], 'w') as f: _ = f.write(str(i) * 4096)
+    >>> with ThreadPoolExecutor(8) as pool:
+    ...     _ = list(pool.map(lambda g: cache.store('same', g), graphs * 4))
+    >>> stored = open(cache.path('same', graphs[0])).read()
+    >>> len(stored), len(set(stored))
+    (4096, 1)
+    >>> os.listdir(cache.cache_dir)
+    ['same.dot']
+    >>> shutil.rmtree(tmp)
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path(self, key, filename):
+        # keep the extension, as the format is deduced from it
+        return os.path.join(self.cache_dir,
+                            key + os.path.splitext(filename)[1])
+
+    def fetch(self, key, filename):
+        """
+        Put the graph cached under :param: key at :param: filename
+
+        :rtype: bool - False if the graph is not in the cache
+        """
+        cached = self.path(key, filename)
+        if not os.path.isfile(cached):
+            return False
+        if os.path.lexists(filename):
+            os.unlink(filename)
+        try:
+            os.link(cached, filename)
+        except OSError:
+            try:
+                shutil.copyfile(cached, filename)
+            except FileNotFoundError:
+                # evicted in the meantime
+                return False
+        try:
+            os.utime(cached)  # mark as recently used
+        except OSError:
+            pass
+        return True
+
+    def store(self, key, filename):
+        """
+        Add the graph rendered at :param: filename to the cache
+        """
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+        cached = self.path(key, filename)
+        # a fresh temporary per call, as threads share the pid; copied rather
+        # than linked, so the graph is never written through another link
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copy(filename, tmp)
+            os.replace(tmp, cached)
+        except BaseException:
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the graphs least recently used until the cache fits in
+        :attr:`max_bytes`
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.tmp'):
+                continue  # being stored
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, entry.path, stat.st_size))
+            total += stat.st_size
+        entries.sort()
+        for mtime, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class LayoutCache(object):
+    """
+    Keep the position of the vertices drawn, so that the next graph drawn,
+    e.g. at the next turn of a dialogue, only has to place its new vertices.
+    The vertices are identified by a key, e.g. their label.
+
+    A new vertex is put one level under a placed parent, to the right of its
+    placed siblings, or else one level above a placed child; the vertices of
+    a graph without any placed vertex are laid out as a tree.
+
+    >>> from igraph import Graph
+    >>> cache = LayoutCache()
+    >>> g = Graph([(0, 1)], directed=True)
+    >>> layout = cache.layout(g, ['c', 'arg1'], roots=[0])
+    >>> layout.coords
+    [[0.0, 0.0], [0.0, 1.0]]
+    >>> g.add_vertices(2)
+    >>> g.add_edges([(0, 2), (2, 3)])
+    >>> cache.layout(g, ['c', 'arg1', 'arg2', 'p'], roots=[0]).coords
+    [[0.0, 0.0], [0.0, 1.0], [1.0, 1.0], [1.0, 2.0]]
+    """
+
+    def __init__(self):
+        self.positions = dict()  # key -> [x, y]
+
+    def layout(self, g, keys, roots):
+        """
+        The layout of the graph :param: g whose vertices have the given
+        :param: keys; :param: roots are used if the tree layout is needed
+
+        :rtype: igraph.Layout
+        """
+        coords = [self.positions.get(key) for key in keys]
+        if not any(coords):
+            ALL = 3  # from igraph
+            coords = g.layout_reingold_tilford(mode=ALL, root=roots).coords
+        else:
+            coords = [None if c is None else list(c) for c in coords]
+            pending = [i for i, c in enumerate(coords) if c is None]
+            while pending:
+                rest = []
+                for i in pending:
+                    parents = [j for j in g.predecessors(i) if coords[j]]
+                    children = [j for j in g.successors(i) if coords[j]]
+                    if parents:
+                        x, y = coords[parents[0]]
+                        siblings = [
+                            coords[j][0] for j in g.successors(parents[0])
+                            if coords[j]
+                        ]
+                        coords[i] = [max(siblings + [x - 1]) + 1, y + 1]
+                    elif children:
+                        x, y = coords[children[0]]
+                        coords[i] = [x, y - 1]
+                    else:
+                        rest.append(i)
+                if len(rest) == len(pending):
+                    # not connected to any placed vertex: start a new tree
+                    # on the right
+                    x = max(c[0] for c in coords if c)
+                    coords[rest.pop(0)] = [x + 1, 0]
+                pending = rest
+        from igraph import Layout  # only needed to draw
+        self.positions.update(zip(keys, coords))
+        return Layout(coords)
+
+
+class Renderer(object):
+    """
+    Render the argumentation graphs in the background
+
+    :param workers: the number of workers; if 0, the graphs are rendered
+    right away when they are submitted
+    :param max_pending: the size of the queue; submitting a request when the
+    queue is full blocks until a request is done
+    :param processes: use worker processes instead of threads
+    :param cache: a :class:`RenderCache` of the graphs already rendered
+    :param lod: the keyword arguments of ``ArgumentSet.lod``, to render a
+    level of detail of the graphs instead of every argument
+    """
+
+    def __init__(self,
+                 workers=1,
+                 max_pending=16,
+                 processes=False,
+                 cache=None,
+                 lod=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.processes = processes
+        self.cache = cache
+        self.lod = lod
+        self.executor = None
+        self.pending = []
+        self.slots = BoundedSemaphore(max_pending)
+
+    def submit(self,
+               argset,
+               g_filename=None,
+               dot_filename=None,
+               layout_cache=None):
+        """
+        Queue the rendering of :param: argset, see :func:`render`.
+
+        The vertices are placed with :param: layout_cache right away, in the
+        order the graphs are submitted, so that the layouts do not depend on
+        the workers; only the positions are sent to them.
+        """
+        lod = self.lod
+        layout = None
+        if layout_cache is not None and g_filename is not None:
+            if lod is not None:
+                argset, lod = argset.lod(**lod), None
+            elif hasattr(argset, 'to_argset'):
+                argset = argset.to_argset()
+            layout = argset.layout(layout_cache)
+
+        if not self.workers:
+            render(argset, g_filename, dot_filename, self.cache, None, lod,
+                   layout)
+            return
+
+        if self.executor is None:
+            if self.processes:
+                # multiprocessing is slow to import, and seldom used
+                from concurrent.futures import ProcessPoolExecutor
+                self.executor = ProcessPoolExecutor(self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(self.workers)
+        if self.processes and hasattr(argset, 'to_argset'):
+            # a version refers to the whole argset it was taken from; only
+            # send the graph to be rendered to the worker
+            argset = argset.to_argset()
+
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(render, argset, g_filename,
+                                          dot_filename, self.cache, None, lod,
+                                          layout)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda f: self.slots.release())
+        self.pending.append(future)
+
+    def flush(self):
+        """
+        Wait until all the graphs submitted are rendered, then stop the
+        workers. The first error raised by a rendering, if any, is raised
+        again here.
+        """
+        pending, self.pending = self.pending, []
+        error = None
+        for future in pending:
+            e = future.exception()
+            if e is not None:
+                logging.error('Rendering failed: {}'.format(e))
+                if error is None:
+                    error = e
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if error is not None:
+            raise error
+
+
+def render_dot_files(paths, fmt='pdf', workers=1, dot='dot', chunk_size=256):
+    """
+    Render the graphviz :param: paths to :param: fmt, each next to its dot
+    file (`1_final.dot` -> `1_final.pdf`).
+
+    Instead of launching `dot` for each file, each `dot` process renders a
+    chunk of :param: chunk_size files (`dot -T<fmt> -O files...`), and at
+    most :param: workers of them run at a time.
+
+    :rtype: list - the filenames written
+
+    >>> render_dot_files(['full.dot'], 'gif')
+    Traceback (most recent call last):
+    ...
+    error.RenderError: Cannot render to "gif", use one of pdf, svg, png
+    """
+    import subprocess
+    if fmt not in DOT_FORMATS:
+        raise RenderError('Cannot render to "{}", use one of {}'.format(
+            fmt, ', '.join(DOT_FORMATS)))
+    paths = list(paths)
+    if not paths:
+        return []
+    executable = shutil.which(dot)
+    if executable is None:
+        raise RenderError('Graphviz "{}" not found'.format(dot))
+
+    def run(chunk):
+        process = subprocess.run(
+            [executable, '-T' + fmt, '-O'] + chunk,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True)
+        if process.returncode:
+            raise RenderError('{} failed: {}'.format(
+                dot, process.stderr.strip()))
+        outputs = []
+        for path in chunk:
+            # -O names the output after the whole input filename
+            output = os.path.splitext(path)[0] + '.' + fmt
+            os.replace(path + '.' + fmt, output)
+            outputs.append(output)
+        return outputs
+
+    chunks = [
+        paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)
+    ]
+    with ThreadPoolExecutor(max(1, workers)) as executor:
+        results = list(executor.map(run, chunks))
+    logging.info('Rendered {} dot files to {} with {} {} process(es)'.format(
+        len(paths), fmt, len(chunks), dot))
+    return [output for outputs in results for output in outputs]
+
+
+# -----------------------------------------------------------------------
+# MAIN
+# -----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
@@ -0,0 +1,195 @@
+"""
+Replay of a recorded dialogue.
+
+A :class:`DialogueReplay` rebuilds the `dialogue_state_argset` of a dialogue
+at any point from its event log (see :mod:`events`), without running CAES
+again. The state can then be queried, drawn or written to graphviz on demand.
+
+>>> from events import TurnEvent
+>>> def entry(arg_id, conclusion, premises):
+...     return {'arg_id': arg_id, 'claimer': 'PROPONENT',
+...             'conclusion': conclusion, 'premises': premises,
+...             'exceptions': [], 'weight': 0.5}
+>>> log = [
+...     TurnEvent(0, 0, 'PROPONENT', 'i', '?', False, 'i', None,
+...               [entry('arg1', 'i', ['s'])], {'i': 'claimed'}),
+...     TurnEvent(1, 0, 'PROPONENT', 'i', True, True, 'i', None,
+...               [entry('arg2', 's', ['p'])], {'s': 'claimed'}),
+...     TurnEvent(2, 1, 'RESPONDENT', 'i', True, True, 'i', None,
+...               [], {'s': 'questioned'})]
+>>> replay = DialogueReplay(log)
+>>> len(replay)
+3
+>>> [str(arg) for arg in replay.seek(0).arguments]
+['[s], ~[] => i']
+>>> [str(arg) for arg in replay.seek(1).get_arguments_status('claimed')]
+['[s], ~[] => i', '[p], ~[] => s']
+>>> [str(arg) for arg in replay.at_turn(1).get_arguments_status('questioned')]
+['[p], ~[] => s']
+
+Any state can be rendered on demand:
+>>> import os, tempfile
+>>> tmp = tempfile.mkdtemp()
+>>> [os.path.basename(f) for f in replay.materialize(tmp + '/1_')]
+['1_0000.dot', '1_0001.dot', '1_0002.dot']
+>>> print(open(tmp + '/1_0001.dot').read()) # doctest: +ELLIPSIS
+digraph G{
+n0 [label="arg1", ...];
+...
+n1 -> n0;
+n0 -> n3;
+...
+}
+<BLANKLINE>
+>>> import shutil; shutil.rmtree(tmp)
+"""
+from bisect import bisect_right
+
+try:
+    from .caes import Argument, ArgumentSet, PropLiteral
+    from .events import read_events
+    from .render import LayoutCache
+except ImportError:
+    from caes import Argument, ArgumentSet, PropLiteral
+    from events import read_events
+    from render import LayoutCache
+
+
+def literal(text):
+    """
+    Convert the string form of a :class:`PropLiteral` back to a PropLiteral
+
+    >>> literal('-a').polarity
+    False
+    """
+    if text[:1] == '-':
+        return PropLiteral(text[1:], polarity=False)
+    return PropLiteral(text)
+
+
+class DialogueReplay(object):
+    """
+    Index the events of a dialogue so that the state at any event can be
+    rebuilt in time linear to the size of that state.
+    """
+
+    def __init__(self, events):
+        self.events = []
+        self.arguments = []  # arguments in the order they were played
+        self.claimers = []
+        self.counts = []  # number of arguments played after each event
+        self.turns = []  # turn number of each event
+        self.history = dict()  # proposition -> ([seq], [state])
+
+        for event in events:
+            seq = len(self.events)
+            self.events.append(event)
+            for entry in event.added:
+                self.arguments.append(
+                    Argument(
+                        conclusion=literal(entry['conclusion']),
+                        premises={literal(p)
+                                  for p in entry['premises']},
+                        exceptions={literal(e)
+                                    for e in entry['exceptions']},
+                        weight=entry['weight'],
+                        arg_id=entry['arg_id']))
+                self.claimers.append(entry['claimer'])
+            for prop, state in event.states.items():
+                seqs, states = self.history.setdefault(literal(prop),
+                                                       ([], []))
+                seqs.append(seq)
+                states.append(state)
+            self.counts.append(len(self.arguments))
+            self.turns.append(event.turn)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Create the replay from a NDJSON event log
+        """
+        return cls(read_events(path))
+
+    def __len__(self):
+        return len(self.events)
+
+    def event(self, seq):
+        return self.events[seq]
+
+    def states(self, seq):
+        """
+        The state of the propositions after the event :param: seq
+        """
+        result = dict()
+        for prop, (seqs, states) in self.history.items():
+            i = bisect_right(seqs, seq)
+            if i:
+                result[prop] = states[i - 1]
+        return result
+
+    def seek(self, seq):
+        """
+        Rebuild the `dialogue_state_argset` right after the event :param: seq
+
+        :rtype: :class:`ArgumentSet`
+        """
+        if seq < 0 or seq >= len(self.events):
+            raise IndexError('No event {} in a dialogue of {} events'.format(
+                seq, len(self.events)))
+        n = self.counts[seq]
+        return ArgumentSet.build(self.arguments[:n], self.claimers[:n],
+                                 self.states(seq))
+
+    def at_turn(self, turn_num):
+        """
+        Rebuild the `dialogue_state_argset` at the end of the turn
+        :param: turn_num
+        """
+        seq = bisect_right(self.turns, turn_num) - 1
+        if seq < 0 or self.turns[seq] != turn_num:
+            raise IndexError('No turn {} in the dialogue'.format(turn_num))
+        return self.seek(seq)
+
+    def materialize(self, prefix, seqs=None, dot=True, pdf=False):
+        """
+        Render the dialogue state after each event in :param: seqs (by
+        default, all the events) to `<prefix><seq>.dot` and/or
+        `<prefix><seq>.pdf`, numbered on 4 digits so that they sort in order
+
+        :rtype: list - the filenames written
+        """
+        if seqs is None:
+            seqs = range(len(self.events))
+        layout_cache = LayoutCache()
+        written = []
+        for seq in seqs:
+            argset = self.seek(seq)
+            name = '{}{:04d}'.format(prefix, seq)
+            if dot:
+                argset.write_to_graphviz(name + '.dot')
+                written.append(name + '.dot')
+            if pdf:
+                argset.draw(name + '.pdf', layout_cache=layout_cache)
+                written.append(name + '.pdf')
+        return written
+
+    def draw(self,
+             seq,
+             g_filename,
+             cache=None,
+             layout_cache=None,
+             layout=None):
+        self.seek(seq).draw(
+            g_filename, cache=cache, layout_cache=layout_cache, layout=layout)
+
+    def write_to_graphviz(self, seq, fname=None, cache=None):
+        self.seek(seq).write_to_graphviz(fname, cache=cache)
+
+
+# -----------------------------------------------------------------------
+# MAIN
+# -----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
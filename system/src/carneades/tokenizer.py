@@ -1,6 +1,9 @@
-import re
+import os, re
 from collections import deque
-from error import TokenizerError
+try:
+    from .error import TokenizerError
+except ImportError:
+    from error import TokenizerError
 
 
 # ---------------------------------------------------------------------------
@@ -20,6 +23,8 @@ class Tokenizer(object):
     >>> t = Tokenizer(stream) # use default indent_size = 2
     >>> t.tokens
     [STMT, MAPPING_VALUE, STMT, STMT, STMT, INDENT, STMT, STMT, STMT, STMT, STMT, INDENT, INDENT, STMT, STMT]
+    >>> [t.lineIdx for t in Tokenizer(stream[:2], first_line=10).tokens]
+    [10, 10, 10, 10, 10, 11, 11, 11, 11, 11, 11]
 
     >>> stream = ['   Testing with 3 spaces as indent\\n']
     >>> try : t = Tokenizer(stream)
@@ -45,32 +50,57 @@ class Tokenizer(object):
     >>> t.tokens
     [STMT, MAPPING_VALUE, SEQUENCE_OPEN, STMT, SEQUENCE_SEPARATOR, STMT, SEQUENCE_SEPARATOR, STMT, STMT, SEQUENCE_CLOSE]
 
+    A sequence is closed on the same line:
+    >>> Tokenizer(['ASSUMPTION: [one, two # three]\\n'])
+    Traceback (most recent call last):
+    ...
+    error.TokenizerError: [ found but is not closed with ] at line 1, column 21
+
     """
 
-    def __init__(self, stream, indent_size=2):
+    def __init__(self, stream, indent_size=2, lazy=False, first_line=1):
         """
         Initialise a tokenizer with a list of string. the :param:indent_size if not defined is 2
+
+        The :param:stream can be any iterable of lines, e.g. an open file or
+        :func:`read_lines`. If :param:lazy is True, the tokens are not
+        collected in :attr:`tokens`; iterate over :meth:`iter_tokens`
+        instead, which reads the stream as the tokens are consumed.
+
+        :param first_line: the line number of the first line of the stream,
+        e.g. when only a part of a file is tokenized
         """
         self.stream = stream
         self.indent_size = indent_size
+        self.first_line = first_line
         self.colIdx = -1
         self.tokens = []
-        self.tokenize()  # call tokenize function
+        if not lazy:
+            self.tokenize()  # call tokenize function
 
     def tokenize(self):
         """
-        Iterate through all the characters in the file and find the tokens
+        Iterate through all the lines of the file and find the tokens
+        """
+        self.tokens.extend(self.iter_tokens())
+
+    def iter_tokens(self):
+        """
+        Yield the tokens of the stream, reading one line at a time
         ---
+        Each line is scanned once, left to right, by matching the master
+        pattern of the current mode (:data:`PLAIN` or :data:`SEQUENCE`) at
+        the current position.
+
+        >>> lines = iter(['A: b\\n', '  c\\n'])
+        >>> tokens = Tokenizer(lines, lazy=True).iter_tokens()
+        >>> next(tokens), next(lines)
+        (STMT, '  c\\n')
         """
-        colIdx = self.colIdx + 1
-        # totalcount = tokenizer.totalcount
-        tokens = self.tokens
-        stream = self.stream
+        indent_size = self.indent_size
 
-        for lineIdx, line in enumerate(stream):
-            # iterate through each line of the file
-            lineIdx += 1  # starts from 1 instead of 0
-            pointer = 0
+        # iterate through each line of the file, numbered from 1
+        for lineIdx, line in enumerate(self.stream, self.first_line):
 
             if line[-1:] != '\n':
                 raise TokenizerError(lineIdx, '-1', 'No end of line found')
@@ -78,39 +108,29 @@ class Tokenizer(object):
                 line = line[:-1]  # remove the end of line!
 
             # ---------------------------------------------------------------
-            #   Find INDENNT:
+            #   Find INDENT:
             # ---------------------------------------------------------------
-            # use regex to find the indent based on the user defined
-            # indent_size
-            indent_pattern = '^ {' + str(self.indent_size) + '}'
-            indent = ' '
-            indents = re.split(indent_pattern, line)
-            depth = -1
-            while len(indents) > 1:
-                depth += 1
-                self.tokens.append(
-                    Token('  ', lineIdx, depth * self.indent_size, 'INDENT'))
-                # shorten the line by removing the indent
-                line = line[self.indent_size:]
-                pointer += self.indent_size
-                indents = re.split(indent_pattern, line)  # get the next indent
+            # the leading spaces must be a whole number of indents of the
+            # user defined indent_size
+            depth = (len(line) - len(line.lstrip(' '))) // indent_size
+            for level in range(depth):
+                yield Token('  ', lineIdx, level * indent_size, 'INDENT')
+            pos = depth * indent_size
 
             # if there are more things to be tokenised, check if whitespaces
             # are well-defined
-            if len(line) and line[0] == ' ':
+            if line[pos:pos + 1] == ' ':
                 raise TokenizerError(
-                    lineIdx, pointer,
+                    lineIdx, pos,
                     'The indent size is {}, but additional whitespace is found'.
-                    format(self.indent_size))
+                    format(indent_size))
 
             # ---------------------------------------------------------------
             #   COMMENT CHECKER:
-            #    Take the nearest # found and truncate the sentence by reducing #    the line
+            #    Take the nearest # found and truncate the line there
             # ---------------------------------------------------------------
             comment_idx = line.find('#')
             if comment_idx != -1:
-                # if there is a comment, shorten the line until the point where
-                # the comment starts, hence ignoring the comments
                 line = line[:comment_idx]
 
             line = line.rstrip()  # remove trailing whitespaces at the back
@@ -118,83 +138,74 @@ class Tokenizer(object):
             # ---------------------------------------------------------------
             #   TOKENIZE the rest of the stuff
             # ---------------------------------------------------------------
-            while len(line):
-                pointer += 1
-                char = line[0]
-
-                if char == ':':
-                    self.tokens.append(
-                        Token(char, lineIdx, pointer, 'MAPPING_VALUE'))
-                    line = line[1:]
-                    continue
-
-                elif char == '[':
-                    line, pointer = self.tokenize_seq(
-                        line, lineIdx,
-                        pointer - 1)  # trigger to find the sequnce
-                    continue
-
-                elif char == ' ':
-                    line = line[1:]  # ignore the white spaces
-                    continue
-
-                else:  # word
-                    # anything as long as it is not a character found above
-                    pattern = r'^[^ :\[]+'
-                    word = re.findall(pattern, line)[0]
-                    self.tokens.append(Token(word, lineIdx, pointer, 'STMT'))
-                    line = line[len(word):]
-                    pointer += len(word) - 1
-                    continue
-
-    def tokenize_seq(self, line, lineIdx, pointer):
-        """
-        Given a line, find the remaining sequence and tokenize them
-        Also, check that the syntax for tokens is well-respected
-        With this, usage of commas is okay as long as it is not in the sequence separator
-        """
-        assert len(line) != 0
-        assert type(line) == str
-
-        while len(line):
-            pointer += 1
-            char = line[0]
-
-            if char == '[':
-                self.tokens.append(
-                    Token(char, lineIdx, pointer, 'SEQUENCE_OPEN'))
-                line = line[1:]
-                continue
-
-            elif char == ']':
-                self.tokens.append(
-                    Token(char, lineIdx, pointer, 'SEQUENCE_CLOSE'))
-                line = line[1:]
-                print(line)
-                return line, pointer  # complete sequence, return to the caller
-
-            elif char == ',':
-                self.tokens.append(
-                    Token(char, lineIdx, pointer, 'SEQUENCE_SEPARATOR'))
-                line = line[1:]
-                continue
-
-            elif char == ' ':
-                line = line[1:]  # ignore the white spaces
-                continue
+            # the column of a token is the (1-based) column of its first
+            # character
+            pattern = PLAIN
+            end = len(line)
+            while pos < end:
+                match = pattern.match(line, pos)
+                if match is None:  # only a ':' in a sequence is not matched
+                    raise TokenizerError(lineIdx, pos + 1,
+                                         ': found in a sequence')
+                tok_type = match.lastgroup
+                if tok_type != 'SPACE':
+                    yield Token(match.group(), lineIdx, pos + 1, tok_type)
+                    if tok_type == 'SEQUENCE_OPEN':
+                        pattern = SEQUENCE
+                    elif tok_type == 'SEQUENCE_CLOSE':
+                        # a nested [ is closed by the first ]
+                        pattern = PLAIN
+                pos = match.end()
+
+            if pattern is SEQUENCE:
+                raise TokenizerError(lineIdx, end,
+                                     '[ found but is not closed with ]')
+
+
+# the master patterns of the tokenizer: one alternative for each type of
+# token. Outside of a sequence, a word (STMT) runs until a space, a : or a [;
+# in a sequence, it also stops at a , or a ].
+PLAIN = re.compile(r"""
+    (?P<SPACE>\ +)
+  | (?P<MAPPING_VALUE>:)
+  | (?P<SEQUENCE_OPEN>\[)
+  | (?P<STMT>[^\ :\[]+)
+""", re.VERBOSE)
+
+SEQUENCE = re.compile(r"""
+    (?P<SPACE>\ +)
+  | (?P<SEQUENCE_OPEN>\[)
+  | (?P<SEQUENCE_CLOSE>\])
+  | (?P<SEQUENCE_SEPARATOR>,)
+  | (?P<STMT>[^\ ,:\[\]]+)
+""", re.VERBOSE)
+
+
+def read_lines(path, buffer_size=4096, use_mmap=False):
+    """
+    Yield the lines of the file at :param: path one at a time, so that a file
+    is never held in memory as a whole.
 
-            else:
-                # anything as long as it is not a character found above
-                pattern = r'^[^ ,:\[\]]+'
-                word = re.findall(pattern, line)[0]
-                self.tokens.append(Token(word, lineIdx, pointer, 'STMT'))
-                line = line[len(word):]
-                pointer += len(word) - 1
-                continue
-
-        if len(line) == 0:
-            raise TokenizerError(lineIdx, pointer,
-                                 '[ found but is not closed with ]')
+    :param use_mmap: map the file in memory instead of reading it through a
+    buffer of :param: buffer_size, e.g. for very large files. The lines are
+    decoded as UTF-8 and their `\\r\\n` ends are turned into `\\n`, as
+    when the file is read as text.
+    """
+    if not use_mmap:
+        with open(path, 'r', buffering=buffer_size) as f:
+            yield from f
+        return
+
+    import mmap
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return  # an empty file cannot be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b''):
+                line = line.decode('utf-8')
+                if line.endswith('\r\n'):
+                    line = line[:-2] + '\n'
+                yield line
 
 
 # ---------------------------------------------------------------------------
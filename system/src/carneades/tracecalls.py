@@ -22,7 +22,9 @@ class TraceCalls(object):
     can be decorated; they will all be indented according to their call
     depth.
 
+    Nothing is traced while :attr:`muted` is set.
     """
+    muted = False
 
     def __init__(self, stream=sys.stdout, indent_step=2, show_ret=True):
         """
@@ -40,16 +42,24 @@ class TraceCalls(object):
         @wraps(fn)
         def wrapper(*args, **kwargs):
             indent = ' ' * TraceCalls.cur_indent
-            argstr = ', '.join([str(a) for a in args][1:])
-            self.stream.write("\n{}Calling {}({})".format(indent, fn.__name__,
-                                                          argstr))
-            logging.info("{}Calling {}({})".format(indent, fn.__name__,
-                                                   argstr))
+            argstr = None
+            if not TraceCalls.muted:
+                argstr = ', '.join([str(a) for a in args][1:])
+                self.stream.write("\n{}Calling {}({})".format(
+                    indent, fn.__name__, argstr))
+                logging.info("{}Calling {}({})".format(indent, fn.__name__,
+                                                       argstr))
 
+            # the depth is kept while muted, to indent the calls traced once
+            # unmuted
             TraceCalls.cur_indent += self.indent_step
             ret = fn(*args, **kwargs)
             TraceCalls.cur_indent -= self.indent_step
 
+            if TraceCalls.muted:
+                return ret
+            if argstr is None:  # unmuted during the call
+                argstr = ', '.join([str(a) for a in args][1:])
             if self.show_ret:
                 self.stream.write("\n{}{}({})-->{}".format(indent, fn.__name__,
                                                            argstr, ret))